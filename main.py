@@ -3,8 +3,15 @@ FastAPI Application - Product Recommendation System
 Main entry point for the application server
 """
 import os
+import asyncio
+import atexit
+import logging
+import logging.handlers
+import queue
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 
 from src.routes.products import router as products_router
@@ -18,17 +25,40 @@ from src.routes.profile import router as profile_router  # User profile routes
 from src.routes.preferences import router as preferences_router  # User preferences (wishlist, history)
 from src.routes.conversations import router as conversations_router  # Conversation history (agent memory)
 from src.routes.recommendations import router as recommendations_router  # AI-powered recommendations
+from src.database.connection import engine
+from src.database.deals_view import create_deals_view, refresh_deals_view, DEALS_VIEW_REFRESH_SECONDS
+from src.agents.product_search_agent import product_search_agent
+from src.agents.price_tracker_agent import price_tracker_agent
+from src.services import kernels as similarity_kernels
+from src.services.trending_refresher import refresh_loop as refresh_trending_loop
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging - records are queued and written by a background
+# listener thread so formatting/IO never blocks the event loop
+_log_queue = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+)
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
+)
+logger = logging.getLogger(__name__)
+
 # Create FastAPI app
 app = FastAPI(
     title="Product Recommendation System",
     description="AI-powered product search and recommendations using Google Gemini",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse  # orjson: faster, compact JSON encoding
 )
 
 # Configure CORS
@@ -47,6 +77,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses (chart data, price history, product lists) over 1 KB
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Include routers
 app.include_router(auth_router)  # Authentication (signup/login)
 app.include_router(profile_router)  # User profile management
@@ -61,6 +94,56 @@ app.include_router(buyplan_router)
 app.include_router(orchestrator_router)  # Master coordinator
 
 
+async def _refresh_deals_view_periodically():
+    """Background task: keep the deals materialized view fresh"""
+    while True:
+        await asyncio.sleep(DEALS_VIEW_REFRESH_SECONDS)
+        try:
+            await asyncio.to_thread(refresh_deals_view, engine)
+        except Exception as e:
+            logger.warning(f"Deals view refresh failed: {e}")
+
+
+@app.on_event("startup")
+async def start_deals_view_refresh():
+    """Create the deals materialized view and start its refresh loop"""
+    try:
+        await asyncio.to_thread(create_deals_view, engine)
+    except Exception as e:
+        logger.error(f"❌ Could not create deals view: {e}")
+    app.state.deals_view_task = asyncio.create_task(_refresh_deals_view_periodically())
+
+
+@app.on_event("startup")
+async def start_trending_refresh():
+    """Start the trending products refresh loop"""
+    app.state.trending_task = asyncio.create_task(refresh_trending_loop())
+
+
+@app.on_event("startup")
+async def warm_agents():
+    """Warm the per-worker agent singletons so the first request skips init cost"""
+    try:
+        await asyncio.to_thread(product_search_agent._warmup)
+        await price_tracker_agent._warmup()
+        await asyncio.to_thread(similarity_kernels.warmup)
+        logger.info("✅ Agents warmed up")
+    except Exception as e:
+        logger.warning(f"Agent warmup failed: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_deals_view_refresh():
+    """Stop the deals view refresh loop"""
+    app.state.deals_view_task.cancel()
+
+
+@app.on_event("shutdown")
+async def stop_trending_refresh():
+    """Stop the trending products refresh loop"""
+    app.state.trending_task.cancel()
+
+
 @app.get("/")
 async def root():
     """Root endpoint - API information"""
@@ -0,0 +1,31 @@
+"""
+Rebuild denormalized wishlist category counts
+Recomputes wishlist_category_counts from the wishlist table to guard
+against drift. Schedule nightly (e.g. cron: 0 3 * * *).
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.connection import SessionLocal
+from src.services.wishlist_stats import rebuild_category_counts
+
+def main():
+    """Recompute all per-user wishlist category counts"""
+    db = SessionLocal()
+    
+    try:
+        print("\n🔧 Rebuilding wishlist category counts...")
+        rows = rebuild_category_counts(db)
+        print(f"✅ Wrote {rows} (user, category) counts")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Rebuild failed: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -87,7 +87,7 @@ class BuyPlanOptimizerAgent:
                 }
             
             # Check EMI eligibility
-            emi_eligibility = await buyplan_tools.get_emi_eligibility(float(product.price))
+            emi_eligibility = buyplan_tools.get_emi_eligibility(float(product.price))
             
             # Generate AI recommendation
             ai_recommendation = await self._generate_ai_recommendation(
@@ -201,12 +201,9 @@ class ComparisonAgent:
             User: "Compare wireless headphones under 5000"
             Agent: Searches → Finds top 3 → Compares → Declares winner
         """
-        from src.agents.product_search_agent import ProductSearchAgent
+        from src.agents.product_search_agent import product_search_agent as search_agent
         
         try:
-            # Create search agent instance
-            search_agent = ProductSearchAgent()
-            
             # Validate top_n
             if top_n < 2:
                 top_n = 2
@@ -21,7 +21,7 @@ from typing import Dict, Any, List, Optional
 import logging
 from datetime import datetime
 
-from src.agents.product_search_agent import ProductSearchAgent
+from src.agents.product_search_agent import product_search_agent
 from src.agents.review_analyzer_agent import review_analyzer_agent
 from src.agents.price_tracker_agent import price_tracker_agent
 from src.agents.comparison_agent import comparison_agent
@@ -58,8 +58,8 @@ class OrchestratorAgent:
         self.client = ollama
         self.model_name = os.getenv('OLLAMA_MODEL', 'llama3.1')
         
-        # Initialize product search agent
-        self.product_search_agent = ProductSearchAgent()
+        # Shared product search agent (embedding model loaded once per worker)
+        self.product_search_agent = product_search_agent
         
         # Test Ollama connection
         try:
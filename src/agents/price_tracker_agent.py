@@ -17,8 +17,10 @@ import ollama
 import asyncio
 from src.tools.price_tools import price_tools
 from src.database.connection import get_db
-from src.database.models import Product
+from src.database.models import Product, PriceHistory
+from sqlalchemy.orm import selectinload
 from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
 import logging
 import os
 
@@ -41,6 +43,17 @@ class PriceTrackerAgent:
             print(f"[WARN]  Ollama not running. Start with: ollama serve")
             print(f"   Error: {e}")
     
+    async def _warmup(self):
+        """Open a pooled DB connection ahead of the first request (app startup)"""
+        def _ping():
+            db = next(get_db())
+            try:
+                db.query(Product.id).limit(1).all()
+            finally:
+                db.close()
+        
+        await asyncio.to_thread(_ping)
+    
     async def analyze_price(
         self,
         product_id: int
@@ -296,18 +309,40 @@ Keep it conversational and helpful. Start with your recommendation."""
         Returns:
             Price comparison data for all products
         """
-        comparisons = []
+        db = next(get_db())
+        
+        try:
+            # One IN query for the products + one for their last 30 days of prices
+            cutoff_date = datetime.utcnow() - timedelta(days=30)
+            products = db.query(Product).options(
+                selectinload(Product.price_history.and_(PriceHistory.recorded_at >= cutoff_date))
+            ).filter(
+                Product.id.in_(product_ids)
+            ).all()
+        finally:
+            db.close()
+        
+        products_by_id = {product.id: product for product in products}
         
+        comparisons = []
         for product_id in product_ids:
-            analysis = await self.analyze_price(product_id)
-            if analysis.get('success'):
-                comparisons.append({
-                    "product_id": product_id,
-                    "product_name": analysis['product_name'],
-                    "current_price": analysis['price_data']['current_price'],
-                    "trend": analysis['price_data']['trend'],
-                    "recommendation": analysis['recommendation']
-                })
+            product = products_by_id.get(product_id)
+            if not product or not product.price_history:
+                continue
+            
+            history = [
+                {"price": float(h.price), "date": h.recorded_at.isoformat()}
+                for h in sorted(product.price_history, key=lambda h: h.recorded_at, reverse=True)
+            ]
+            trend_data = price_tools.summarize_price_trend(history, float(product.price))
+            
+            comparisons.append({
+                "product_id": product_id,
+                "product_name": product.name,
+                "current_price": trend_data['current_price'],
+                "trend": trend_data['trend'],
+                "recommendation": trend_data['recommendation']
+            })
         
         return {
             "success": True,
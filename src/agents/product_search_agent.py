@@ -11,6 +11,7 @@ import ollama
 from src.database.models import Product, Review, PriceHistory, CardOffer
 from src.database.connection import get_db
 from src.database.embeddings import EmbeddingGenerator
+from src.database.setup_vector_db import get_products_collection
 
 
 class ProductSearchAgent:
@@ -33,6 +34,20 @@ class ProductSearchAgent:
         # Initialize embedding generator for semantic search
         self.embedder = EmbeddingGenerator()
     
+    def _warmup(self):
+        """
+        Pay one-time initialization costs up front (called on app startup):
+        first embedding inference, vector DB collection open, DB pool connection
+        """
+        self.embedder.generate_embedding("warmup")
+        get_products_collection()
+        
+        db = next(get_db())
+        try:
+            db.execute(text("SELECT 1"))
+        finally:
+            db.close()
+    
     def search_products(
         self, 
         query: str, 
@@ -663,3 +678,7 @@ Keep it conversational and helpful. Maximum 3 sentences."""
             }
         finally:
             db.close()
+
+
+# Global instance for easy importing (one embedding model per worker)
+product_search_agent = ProductSearchAgent()
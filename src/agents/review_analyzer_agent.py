@@ -52,17 +52,12 @@ class ReviewAnalyzerAgent:
             logger.info(f"Analyzing reviews for product {product_id}")
             
             # Get reviews and statistics
-            reviews = await review_tools.get_reviews(
+            reviews, stats = await review_tools.get_reviews_with_statistics(
                 db=db,
                 product_id=product_id,
                 limit=100
             )
             
-            stats = await review_tools.get_review_statistics(
-                db=db,
-                product_id=product_id
-            )
-            
             # Extract themes early (needed for both LLM and fallback)
             themes = await review_tools.extract_themes(reviews)
             
@@ -5,9 +5,12 @@ This module provides database session management for PostgreSQL
 """
 
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
-from src.database.models import Base
+from src.database.models import Base, Product, Wishlist, SearchHistory, ConversationHistory
+from src.database.deals_view import create_deals_view
 import os
 from dotenv import load_dotenv
 import logging
@@ -43,6 +46,27 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+# Async engine (asyncpg) for route handlers that query directly,
+# so DB waits yield to the event loop instead of blocking it
+ASYNC_DATABASE_URL = make_url(DATABASE_URL).set(drivername="postgresql+asyncpg")
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    echo=False
+)
+
+# Create async session factory
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 def get_db() -> Session:
     """
     Get database session (for FastAPI dependency injection)
@@ -59,6 +83,19 @@ def get_db() -> Session:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncSession:
+    """
+    Get async database session (for FastAPI dependency injection)
+    
+    Usage:
+        @app.get("/products")
+        async def get_products(db: AsyncSession = Depends(get_async_db)):
+            products = (await db.scalars(select(Product))).all()
+            return products
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """
     Initialize database by creating all tables
@@ -73,7 +110,15 @@ def init_db():
     """
     try:
         logger.info("🔧 Creating database tables...")
+        with engine.begin() as connection:
+            # Required by the trigram index on products.brand
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         Base.metadata.create_all(bind=engine)
+        # create_all skips indexes on tables that already exist
+        for model in (Product, Wishlist, SearchHistory, ConversationHistory):
+            for index in model.__table__.indexes:
+                index.create(bind=engine, checkfirst=True)
+        create_deals_view(engine)
         logger.info("✅ Database tables created successfully!")
         return True
     except Exception as e:
@@ -0,0 +1,91 @@
+# src/database/deals_view.py
+"""
+Materialized view of per-product deal metrics (discount %, flash-deal flag)
+
+Deals change on the order of minutes but are requested on every page load,
+so the aggregation over price_history runs once per refresh instead of once
+per request. The view is created on startup and refreshed every
+DEALS_VIEW_REFRESH_SECONDS by a background task (see main.py).
+
+Flash deal = in stock with MRP, and either
+1. price dropped >=10% between the 3rd-latest and latest entry of the last 7 days
+2. OR latest price of the last 7 days is within 1% of the 90-day low
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEALS_VIEW_REFRESH_SECONDS = 60
+
+CREATE_DEALS_VIEW = text("""
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_product_deals AS
+SELECT
+    p.id AS product_id,
+    p.name,
+    p.brand,
+    p.category,
+    p.price,
+    p.mrp,
+    p.rating,
+    p.review_count,
+    (p.mrp - p.price) / p.mrp * 100 AS discount_pct,
+    COALESCE(
+        ph.week_count >= 2 AND (
+            (ph.week_count >= 3 AND (ph.week_third - ph.week_latest) / ph.week_third * 100 >= 10)
+            OR ph.week_latest <= ph.min_90d * 1.01
+        ),
+        FALSE
+    ) AS is_flash_deal
+FROM products p
+LEFT JOIN (
+    SELECT
+        product_id,
+        min(price) AS min_90d,
+        count(week_rank) AS week_count,
+        max(price) FILTER (WHERE week_rank = 1) AS week_latest,
+        max(price) FILTER (WHERE week_rank = 3) AS week_third
+    FROM (
+        SELECT
+            product_id,
+            price,
+            CASE WHEN recorded_at >= timezone('utc', now()) - interval '7 days' THEN
+                row_number() OVER (
+                    PARTITION BY product_id, recorded_at >= timezone('utc', now()) - interval '7 days'
+                    ORDER BY recorded_at DESC
+                )
+            END AS week_rank
+        FROM price_history
+        WHERE recorded_at >= timezone('utc', now()) - interval '90 days'
+    ) h
+    GROUP BY product_id
+) ph ON ph.product_id = p.id
+WHERE p.mrp IS NOT NULL
+  AND p.mrp > 0
+  AND p.in_stock = TRUE
+""")
+
+# Unique index is required for REFRESH ... CONCURRENTLY
+CREATE_DEALS_VIEW_INDEXES = [
+    text("CREATE UNIQUE INDEX IF NOT EXISTS ix_mv_product_deals_product_id ON mv_product_deals (product_id)"),
+    text("CREATE INDEX IF NOT EXISTS ix_mv_product_deals_category_discount ON mv_product_deals (category, discount_pct DESC)"),
+]
+
+REFRESH_DEALS_VIEW = text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_product_deals")
+
+
+def create_deals_view(engine: Engine):
+    """Create the deals materialized view and its indexes (idempotent)"""
+    with engine.begin() as connection:
+        connection.execute(CREATE_DEALS_VIEW)
+        for index in CREATE_DEALS_VIEW_INDEXES:
+            connection.execute(index)
+    logger.info("✅ Deals materialized view ready")
+
+
+def refresh_deals_view(engine: Engine):
+    """Recompute the deals materialized view without blocking readers"""
+    with engine.begin() as connection:
+        connection.execute(REFRESH_DEALS_VIEW)
@@ -1,7 +1,7 @@
 # src/database/models.py
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index, case, cast, func, literal_column
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 
 Base = declarative_base()
@@ -29,6 +29,19 @@ class Product(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # list_products: ORDER BY coalesce(rating, 0.0) DESC, id DESC keyset pages
+        # (index-order scan, no sort; coalesce so unrated products sort and page too)
+        Index('ix_product_sort_rating_id', func.coalesce(rating, literal_column('0.0')).desc(), id.desc()),
+        Index('ix_product_cat_sort_rating', 'category', func.coalesce(rating, literal_column('0.0')).desc(), id.desc()),
+        # Category + price range filters
+        Index('ix_product_cat_price', 'category', 'price'),
+        # In-stock products of a category (similar products, category recommendations)
+        Index('ix_product_cat_stock', 'category', 'in_stock'),
+        # Substring brand filter (ILIKE '%...%') - needs the pg_trgm extension
+        Index('ix_product_brand_trgm', 'brand', postgresql_using='gin', postgresql_ops={'brand': 'gin_trgm_ops'}),
+    )
+    
     # Relationships
     reviews = relationship("Review", back_populates="product", cascade="all, delete-orphan")
     price_history = relationship("PriceHistory", back_populates="product", cascade="all, delete-orphan")
@@ -119,6 +132,10 @@ class CardOffer(Base):
     cashback_amount = Column(Float)
     min_transaction_amount = Column(Float)
     emi_tenure = Column(String(50))
+    # emi_tenure as an integer when it is all digits, else NULL (computed in SQL on load)
+    emi_tenure_months = column_property(
+        case((emi_tenure.regexp_match('^[0-9]+$'), cast(emi_tenure, Integer)), else_=None)
+    )
     is_no_cost_emi = Column(Boolean, default=False)
     offer_description = Column(Text)
     is_active = Column(Boolean, default=True)
@@ -147,6 +164,21 @@ class Wishlist(Base):
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     notes = Column(Text)
     added_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # A user's wishlist (recommendations, wishlist page)
+        Index('ix_wishlist_user', 'user_id'),
+    )
+    
+    product = relationship("Product")
+
+class WishlistCategoryCount(Base):
+    """Per-user wishlist category counts (denormalized, updated on wishlist writes)"""
+    __tablename__ = "wishlist_category_counts"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
 
 class SearchHistory(Base):
     """Search history model"""
@@ -158,6 +190,11 @@ class SearchHistory(Base):
     results_count = Column(Integer)
     clicked_product_id = Column(Integer)
     search_timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Trending: clicks within a recent time window
+        Index('ix_search_ts_click', 'search_timestamp', 'clicked_product_id'),
+    )
 
 class ConversationHistory(Base):
     """Conversation history model for agent memory"""
@@ -173,6 +210,11 @@ class ConversationHistory(Base):
     intent = Column(String(50))  # search, compare, buy_plan, etc.
     sentiment = Column(String(20))  # positive, neutral, negative
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # A user's most recent conversations (agent memory)
+        Index('ix_conv_user_created', 'user_id', created_at.desc()),
+    )
 
 class UserInteraction(Base):
     """User interaction model for collaborative filtering"""
@@ -13,6 +13,7 @@ For Beginners:
 - Response = Data sent back to frontend
 """
 
+from anyio import to_thread
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr, Field
@@ -222,7 +223,7 @@ async def signup(
         )
     
     # Hash password
-    password_hash = PasswordHasher.hash_password(request.password)
+    password_hash = await to_thread.run_sync(PasswordHasher.hash_password, request.password)
     
     # Create new user
     new_user = User(
@@ -299,7 +300,7 @@ async def login(
         )
     
     # Verify password
-    if not PasswordHasher.verify_password(request.password, user.password_hash):
+    if not await to_thread.run_sync(PasswordHasher.verify_password, request.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
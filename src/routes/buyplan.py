@@ -304,7 +304,7 @@ async def get_emi_plans(
             product_price = float(product.price)
             
             # Check EMI eligibility
-            eligibility = await buyplan_tools.get_emi_eligibility(product_price)
+            eligibility = buyplan_tools.get_emi_eligibility(product_price)
             
             result = {
                 "success": True,
@@ -320,11 +320,11 @@ async def get_emi_plans(
             
             # Calculate EMI plans based on type requested
             if plan_type in ["regular", "both"]:
-                regular_emi = await buyplan_tools.calculate_emi_plans(product_price)
+                regular_emi = buyplan_tools.calculate_emi_plans(product_price)
                 result['regular_emi_plans'] = regular_emi
             
             if plan_type in ["no_cost", "both"]:
-                no_cost_emi = await buyplan_tools.calculate_no_cost_emi(product_price)
+                no_cost_emi = buyplan_tools.calculate_no_cost_emi(product_price)
                 result['no_cost_emi_plans'] = no_cost_emi
             
             return result
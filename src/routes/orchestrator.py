@@ -11,15 +11,32 @@ This provides a unified API that coordinates all 5 agents:
 Single API call → Complete recommendation
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel, Field
 from typing import Optional, List
+from functools import lru_cache
+import hashlib
 import logging
+import time
+
+import orjson
 
 from src.agents.orchestrator_agent import orchestrator_agent
+from src.agents.product_search_agent import product_search_agent
+from src.agents.review_analyzer_agent import review_analyzer_agent
+from src.agents.price_tracker_agent import price_tracker_agent
+from src.agents.comparison_agent import comparison_agent
+from src.agents.buyplan_optimizer_agent import buyplan_optimizer_agent
+from src.utils.redis_cache import cache_get, cache_set
 
 logger = logging.getLogger(__name__)
 
+# Ollama is re-probed at most once per bucket (seconds)
+OLLAMA_PROBE_INTERVAL = 5
+
+# TTL (seconds) for cached GET /api/orchestrate/ responses
+ORCHESTRATE_CACHE_TTL = 900
+
 router = APIRouter(prefix="/api/orchestrate", tags=["Orchestrator"])
 
 
@@ -130,10 +147,7 @@ async def orchestrate_simple_recommendation(request: OrchestrateRequestSimple):
     - Frontend with minimal UI
     """
     try:
-        import sys
-        log_msg = f"[DEBUG] /simple endpoint called with query: '{request.query}'\n"
-        sys.stdout.write(log_msg)
-        sys.stdout.flush()
+        logger.debug("/simple endpoint called with query: '%s'", request.query)
         
         result = await orchestrator_agent.orchestrate_recommendation(
             query=request.query,
@@ -141,23 +155,20 @@ async def orchestrate_simple_recommendation(request: OrchestrateRequestSimple):
             user_preference="balanced"
         )
         
-        log_msg2 = f"[DEBUG] Orchestrator result success={result.get('success')}, products={len(result.get('products', []))}, error={result.get('error')}\n"
-        sys.stdout.write(log_msg2)
-        sys.stdout.flush()
+        logger.debug(
+            "Orchestrator result success=%s, products=%d, error=%s",
+            result.get('success'), len(result.get('products', [])), result.get('error')
+        )
         
         if not result.get('success'):
             error_msg = result.get('error', 'No products found matching your query')
-            log_msg3 = f"[DEBUG] Raising 404: {error_msg}\n"
-            sys.stdout.write(log_msg3)
-            sys.stdout.flush()
+            logger.debug("Raising 404: %s", error_msg)
             raise HTTPException(
                 status_code=404,
                 detail=error_msg
             )
         
-        log_msg4 = f"[DEBUG] Returning {len(result.get('products', []))} products\n"
-        sys.stdout.write(log_msg4)
-        sys.stdout.flush()
+        logger.debug("Returning %d products", len(result.get('products', [])))
         return result
         
     except HTTPException:
@@ -172,6 +183,7 @@ async def orchestrate_simple_recommendation(request: OrchestrateRequestSimple):
 
 @router.get("/", summary="GET Alternative (with query params)")
 async def orchestrate_with_query_params(
+    request: Request,
     query: str = Query(..., description="Product search query", example="wireless mouse"),
     category: Optional[str] = Query(None, description="Category filter"),
     min_price: Optional[float] = Query(None, description="Minimum price"),
@@ -191,7 +203,26 @@ async def orchestrate_with_query_params(
     - Direct browser access
     - Simple HTTP clients
     - URL sharing
+    
+    **Caching:**
+    - Responses are cached in Redis for 15 minutes (`X-Cache: HIT/MISS`)
+    - Send `If-None-Match` with the returned `ETag` to get a 304
     """
+    cache_key = "orch:" + hashlib.blake2b(
+        orjson.dumps((query, category, min_price, max_price, top_n, user_preference)),
+        digest_size=16
+    ).hexdigest()
+    headers = {
+        "ETag": f'"{cache_key}"',
+        "Cache-Control": f"public, max-age={ORCHESTRATE_CACHE_TTL}"
+    }
+    
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        return Response(cached, media_type="application/json", headers={**headers, "X-Cache": "HIT"})
+    
     try:
         result = await orchestrator_agent.orchestrate_recommendation(
             query=query,
@@ -208,7 +239,9 @@ async def orchestrate_with_query_params(
                 detail=result.get('error', 'No products found')
             )
         
-        return result
+        body = orjson.dumps(result, default=str, option=orjson.OPT_NON_STR_KEYS)
+        await cache_set(cache_key, body, ORCHESTRATE_CACHE_TTL)
+        return Response(body, media_type="application/json", headers={**headers, "X-Cache": "MISS"})
         
     except HTTPException:
         raise
@@ -220,6 +253,16 @@ async def orchestrate_with_query_params(
         )
 
 
+@lru_cache(maxsize=1)
+def _ollama_status_cached(bucket: int) -> str:
+    """Probe Ollama once per time bucket (cached by bucket number)"""
+    try:
+        orchestrator_agent.client.list()
+        return "connected"
+    except Exception:
+        return "disconnected"
+
+
 @router.get("/health", summary="Orchestrator Health Check")
 async def health_check():
     """
@@ -240,18 +283,8 @@ async def health_check():
     - Debugging
     """
     try:
-        from src.agents.product_search_agent import product_search_agent
-        from src.agents.review_analyzer_agent import review_analyzer_agent
-        from src.agents.price_tracker_agent import price_tracker_agent
-        from src.agents.comparison_agent import comparison_agent
-        from src.agents.buyplan_optimizer_agent import buyplan_optimizer_agent
-        
-        # Test Ollama connection
-        ollama_status = "connected"
-        try:
-            orchestrator_agent.client.list()
-        except:
-            ollama_status = "disconnected"
+        # Test Ollama connection (cached, re-probed every few seconds)
+        ollama_status = _ollama_status_cached(int(time.time() // OLLAMA_PROBE_INTERVAL))
         
         return {
             "status": "healthy",
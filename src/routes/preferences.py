@@ -1,16 +1,24 @@
 # src/routes/preferences.py
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, select
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from src.database.connection import get_db
-from src.database.models import Wishlist, SearchHistory, Product, User
+from src.database.connection import get_db, AsyncSessionLocal
+from src.database.models import Wishlist, WishlistCategoryCount, SearchHistory, Product, User
+from src.services.wishlist_stats import adjust_category_count
 from src.utils.middleware import get_current_user
+from src.utils.redis_cache import redis_cached, cache_delete
 
 router = APIRouter(prefix="/preferences", tags=["preferences"])
 
+def _stats_cache_key(user_id: int) -> str:
+    """Redis key of a user's cached preferences stats"""
+    return f"prefs_stats:{user_id}"
+
 # ============================================================================
 # Pydantic Models
 # ============================================================================
@@ -106,7 +114,9 @@ async def add_to_wishlist(
     )
     
     db.add(wishlist_item)
+    adjust_category_count(db, current_user.id, product.category, 1)
     db.commit()
+    await cache_delete(_stats_cache_key(current_user.id))
     db.refresh(wishlist_item)
     
     # Add product details to response
@@ -138,14 +148,17 @@ async def get_wishlist(
     - **skip**: Number of items to skip (for pagination)
     - **limit**: Maximum number of items to return
     """
-    wishlist_items = db.query(Wishlist).filter(
+    # Products are eager-loaded with a single IN query (selectinload)
+    wishlist_items = db.query(Wishlist).options(
+        selectinload(Wishlist.product)
+    ).filter(
         Wishlist.user_id == current_user.id
     ).order_by(Wishlist.added_at.desc()).offset(skip).limit(limit).all()
     
     # Enrich with product details
     response = []
     for item in wishlist_items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
+        product = item.product
         response.append(WishlistItemResponse(
             id=item.id,
             user_id=item.user_id,
@@ -254,8 +267,11 @@ async def remove_from_wishlist(
             detail="Wishlist item not found"
         )
     
+    if wishlist_item.product:
+        adjust_category_count(db, current_user.id, wishlist_item.product.category, -1)
     db.delete(wishlist_item)
     db.commit()
+    await cache_delete(_stats_cache_key(current_user.id))
     
     return None
 
@@ -277,8 +293,11 @@ async def remove_product_from_wishlist(
             detail="Product not in wishlist"
         )
     
+    if wishlist_item.product:
+        adjust_category_count(db, current_user.id, wishlist_item.product.category, -1)
     db.delete(wishlist_item)
     db.commit()
+    await cache_delete(_stats_cache_key(current_user.id))
     
     return None
 
@@ -325,6 +344,7 @@ async def add_search_history(
     
     db.add(search_entry)
     db.commit()
+    await cache_delete(_stats_cache_key(current_user.id))
     db.refresh(search_entry)
     
     # Get product name if clicked
@@ -360,13 +380,15 @@ async def get_search_history(
         SearchHistory.user_id == current_user.id
     ).order_by(SearchHistory.search_timestamp.desc()).offset(skip).limit(limit).all()
     
-    # Enrich with product names
+    # Enrich with product names (one IN query for all clicked products)
+    product_ids = {entry.clicked_product_id for entry in history if entry.clicked_product_id}
+    product_names = dict(
+        db.query(Product.id, Product.name).filter(Product.id.in_(product_ids)).all()
+    ) if product_ids else {}
+    
     response = []
     for entry in history:
-        product_name = None
-        if entry.clicked_product_id:
-            product = db.query(Product).filter(Product.id == entry.clicked_product_id).first()
-            product_name = product.name if product else None
+        product_name = product_names.get(entry.clicked_product_id)
         
         response.append(SearchHistoryResponse(
             id=entry.id,
@@ -400,6 +422,7 @@ async def delete_search_history_item(
     
     db.delete(history_item)
     db.commit()
+    await cache_delete(_stats_cache_key(current_user.id))
     
     return None
 
@@ -414,6 +437,7 @@ async def clear_search_history(
     ).delete()
     
     db.commit()
+    await cache_delete(_stats_cache_key(current_user.id))
     
     return None
 
@@ -421,48 +445,52 @@ async def clear_search_history(
 # User Preferences & Stats
 # ============================================================================
 
+async def _fetch_all(statement) -> list:
+    """Run a read-only statement on its own pooled session (safe to gather)"""
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(statement)).all()
+
 @router.get("/stats", response_model=UserPreferencesStats)
+@redis_cached("prefs_stats", ttl=60, key=lambda current_user, **_: str(current_user.id))
 async def get_user_preferences_stats(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get user preferences statistics and insights."""
     
-    # Count wishlist items
-    wishlist_count = db.query(Wishlist).filter(
-        Wishlist.user_id == current_user.id
-    ).count()
-    
-    # Count search history
-    search_history_count = db.query(SearchHistory).filter(
-        SearchHistory.user_id == current_user.id
-    ).count()
-    
-    # Get favorite categories (from wishlist)
-    wishlist_items = db.query(Wishlist).filter(
-        Wishlist.user_id == current_user.id
-    ).all()
-    
-    category_count = {}
-    for item in wishlist_items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product and product.category:
-            category_count[product.category] = category_count.get(product.category, 0) + 1
+    # Count wishlist items and search history in one roundtrip
+    counts_query = select(
+        select(func.count(Wishlist.id)).where(
+            Wishlist.user_id == current_user.id
+        ).scalar_subquery(),
+        select(func.count(SearchHistory.id)).where(
+            SearchHistory.user_id == current_user.id
+        ).scalar_subquery()
+    )
     
-    # Sort by count and get top 5
-    favorite_categories = sorted(category_count.items(), key=lambda x: x[1], reverse=True)
-    favorite_categories = [cat for cat, count in favorite_categories[:5]]
+    # Get favorite categories (from denormalized wishlist category counts)
+    favorites_query = select(WishlistCategoryCount.category).where(
+        WishlistCategoryCount.user_id == current_user.id,
+        WishlistCategoryCount.count > 0
+    ).order_by(
+        WishlistCategoryCount.count.desc()
+    ).limit(5)
     
     # Get recent searches (last 10)
-    recent_searches_query = db.query(SearchHistory).filter(
+    recent_query = select(SearchHistory.query).where(
         SearchHistory.user_id == current_user.id
-    ).order_by(SearchHistory.search_timestamp.desc()).limit(10).all()
+    ).order_by(SearchHistory.search_timestamp.desc()).limit(10)
     
-    recent_searches = [entry.query for entry in recent_searches_query]
+    # Independent queries run concurrently, each on its own connection
+    counts, favorites, recent = await asyncio.gather(
+        _fetch_all(counts_query),
+        _fetch_all(favorites_query),
+        _fetch_all(recent_query)
+    )
+    wishlist_count, search_history_count = counts[0]
     
     return UserPreferencesStats(
         wishlist_count=wishlist_count,
         search_history_count=search_history_count,
-        favorite_categories=favorite_categories,
-        recent_searches=recent_searches
+        favorite_categories=[category for category, in favorites],
+        recent_searches=[query for query, in recent]
     )
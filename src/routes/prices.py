@@ -9,9 +9,14 @@ Endpoints:
 - GET /api/price/history/{product_id} - Get price history
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
 from typing import Optional
 from src.agents.price_tracker_agent import price_tracker_agent
+from src.database.connection import get_db
+from src.tools.price_tools import price_tools
+from src.utils.price_chart_generator import price_chart_generator
+from src.utils.redis_cache import redis_cached
 
 # Create router
 router = APIRouter(prefix="/api/price", tags=["Price Tracking"])
@@ -57,6 +62,7 @@ async def track_product_price(product_id: int):
 
 
 @router.get("/deals")
+@redis_cached("deals", ttl=120, key=lambda category, limit, **_: f"{category}:{limit}")
 async def get_best_deals(
     category: Optional[str] = Query(None, description="Filter by category"),
     limit: int = Query(10, ge=1, le=50, description="Number of deals to return")
@@ -94,9 +100,11 @@ async def get_best_deals(
 
 
 @router.get("/flash-deals")
+@redis_cached("flash_deals", ttl=30, key=lambda category, limit, **_: f"{category}:{limit}")
 async def get_flash_deals(
     category: Optional[str] = Query(None, description="Filter by category"),
-    limit: int = Query(10, ge=1, le=20, description="Number of flash deals")
+    limit: int = Query(10, ge=1, le=20, description="Number of flash deals"),
+    db: Session = Depends(get_db)
 ):
     """
     Find ONLY flash/blast deals (urgent deals)
@@ -130,11 +138,6 @@ async def get_flash_deals(
             "count": 5
         }
     """
-    from src.tools.price_tools import price_tools
-    from src.database.connection import get_db
-    
-    db = next(get_db())
-    
     try:
         flash_deals = await price_tools.find_flash_deals(
             db=db,
@@ -154,14 +157,14 @@ async def get_flash_deals(
             status_code=500,
             detail=f"Failed to fetch flash deals: {str(e)}"
         )
-    finally:
-        db.close()
 
 
 @router.get("/history/{product_id}")
 async def get_price_history(
     product_id: int,
-    days: int = Query(30, ge=7, le=365, description="Number of days of history")
+    days: int = Query(30, ge=7, le=365, description="Number of days of history"),
+    buckets: Optional[int] = Query(None, ge=1, le=1000, description="Downsample to at most this many averaged points"),
+    db: Session = Depends(get_db)
 ):
     """
     Get price history for a product
@@ -169,49 +172,45 @@ async def get_price_history(
     Args:
         product_id: ID of product
         days: Number of days (7-365)
+        buckets: Optional max number of points (averaged per time bucket)
         
     Returns:
         Price history data
         
     Example:
-        GET /api/price/history/2?days=90
+        GET /api/price/history/2?days=365&buckets=52
         
-        Returns 90 days of price history
+        Returns a year of price history as weekly averages
     """
-    from src.tools.price_tools import price_tools
-    from src.database.connection import get_db
-    
-    db = next(get_db())
+    history = await price_tools.get_price_history(
+        db=db,
+        product_id=product_id,
+        days=days,
+        buckets=buckets
+    )
     
-    try:
-        history = await price_tools.get_price_history(
-            db=db,
-            product_id=product_id,
-            days=days
+    if not history:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No price history found for product {product_id}"
         )
-        
-        if not history:
-            raise HTTPException(
-                status_code=404,
-                detail=f"No price history found for product {product_id}"
-            )
-        
-        return {
-            "success": True,
-            "product_id": product_id,
-            "history": history,
-            "count": len(history),
-            "days": days
-        }
-        
-    finally:
-        db.close()
+    
+    return {
+        "success": True,
+        "product_id": product_id,
+        "history": history,
+        "count": len(history),
+        "days": days,
+        "buckets": buckets
+    }
 
 
 @router.get("/chart/{product_id}")
+@redis_cached("price_chart", ttl=600, key=lambda product_id, days, **_: f"{product_id}:{days}")
 async def get_price_chart(
     product_id: int,
-    days: int = Query(90, ge=7, le=365, description="Number of days of history")
+    days: int = Query(90, ge=7, le=365, description="Number of days of history"),
+    db: Session = Depends(get_db)
 ):
     """
     Get enhanced price chart data with visual features
@@ -231,43 +230,34 @@ async def get_price_chart(
         
         Returns beautiful chart data ready for rendering
     """
-    from src.tools.price_tools import price_tools
-    from src.utils.price_chart_generator import price_chart_generator
-    from src.database.connection import get_db
+    # Get price history (one averaged point per day)
+    history = await price_tools.get_price_history(
+        db=db,
+        product_id=product_id,
+        days=days,
+        buckets=days
+    )
     
-    db = next(get_db())
+    if not history:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No price history found for product {product_id}"
+        )
     
-    try:
-        # Get price history
-        history = await price_tools.get_price_history(
-            db=db,
-            product_id=product_id,
-            days=days
+    # Generate enhanced chart data
+    chart_data = price_chart_generator.generate_chart_data(history, days)
+    
+    if "error" in chart_data:
+        raise HTTPException(
+            status_code=404,
+            detail=chart_data["error"]
         )
-        
-        if not history:
-            raise HTTPException(
-                status_code=404,
-                detail=f"No price history found for product {product_id}"
-            )
-        
-        # Generate enhanced chart data
-        chart_data = price_chart_generator.generate_chart_data(history, days)
-        
-        if "error" in chart_data:
-            raise HTTPException(
-                status_code=404,
-                detail=chart_data["error"]
-            )
-        
-        return {
-            "success": True,
-            "product_id": product_id,
-            "chart": chart_data
-        }
-        
-    finally:
-        db.close()
+    
+    return {
+        "success": True,
+        "product_id": product_id,
+        "chart": chart_data
+    }
 
 
 @router.post("/compare")
@@ -2,16 +2,37 @@
 FastAPI routes for product search and recommendations
 """
 from typing import Optional
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException
 from pydantic import BaseModel, Field
+from sqlalchemy import and_, func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+import orjson
 
-from src.agents.product_search_agent import ProductSearchAgent
+from src.agents.product_search_agent import product_search_agent
+from src.database.connection import get_async_db
+from src.database.models import Product
 
 
 router = APIRouter(prefix="/api/products", tags=["Products"])
 
-# Initialize agent
-search_agent = ProductSearchAgent()
+# Shared agent instance (see product_search_agent module)
+search_agent = product_search_agent
+
+
+# Keyset sort key: unrated (NULL) products rank as 0.0 instead of dropping out
+# of row-value comparisons (matches the ix_product_*sort_rating indexes)
+SORT_RATING = func.coalesce(Product.rating, literal_column('0.0')).label('sort_rating')
+
+
+def _top_features(raw: Optional[str]) -> list:
+    """First 3 entries of a product's features JSON text ([] if missing or malformed)"""
+    if not raw:
+        return []
+    try:
+        features = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return []
+    return features[:3] if isinstance(features, list) else []
 
 
 class SearchRequest(BaseModel):
@@ -119,21 +140,22 @@ async def list_products(
     max_price: Optional[float] = Query(None, description="Maximum price", ge=0),
     min_rating: Optional[float] = Query(None, description="Minimum rating", ge=1, le=5),
     limit: int = Query(20, description="Maximum results", ge=1, le=100),
-    offset: int = Query(0, description="Results offset", ge=0)
+    after_rating: Optional[float] = Query(None, description="Cursor: rating of the last product on the previous page"),
+    after_id: Optional[int] = Query(None, description="Cursor: id of the last product on the previous page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     List products with optional filters (no AI, direct database query)
-    """
-    from src.database.connection import get_db
-    from src.database.models import Product
-    from sqlalchemy import and_
-    import json
     
-    db = next(get_db())
+    Keyset pagination ordered by rating DESC (unrated products as 0), id DESC:
+    pass the previous response's `next_cursor` back as `after_rating` / `after_id`.
+    `next_cursor` is null on the last page. `total` is only computed
+    for the first page (null when a cursor is given).
+    """
+    if (after_rating is None) != (after_id is None):
+        raise HTTPException(status_code=400, detail="after_rating and after_id must be given together")
     
     try:
-        query = db.query(Product)
-        
         filters = []
         if category:
             filters.append(Product.category == category)
@@ -146,19 +168,43 @@ async def list_products(
         if min_rating:
             filters.append(Product.rating >= min_rating)
         
+        columns = [
+            Product.id,
+            Product.name,
+            Product.brand,
+            Product.model,
+            Product.category,
+            Product.price,
+            Product.mrp,
+            Product.review_count,
+            Product.features,
+            SORT_RATING
+        ]
+        if after_id is None:
+            # First page: total count comes back alongside the page via a window function
+            columns.append(func.count().over().label('total'))
+        else:
+            filters.append(tuple_(SORT_RATING.element, Product.id) < tuple_(after_rating, after_id))
+        
+        # Only the listed columns are loaded; one extra row tells whether there is a next page
+        query = select(*columns)
         if filters:
-            query = query.filter(and_(*filters))
+            query = query.where(and_(*filters))
+        
+        rows = (await db.execute(
+            query.order_by(SORT_RATING.element.desc(), Product.id.desc()).limit(limit + 1)
+        )).all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
-        total = query.count()
-        products = query.order_by(Product.rating.desc()).offset(offset).limit(limit).all()
+        if after_id is None:
+            total = rows[0].total if rows else 0
+        else:
+            total = None
         
         product_list = []
-        for product in products:
-            try:
-                features = json.loads(product.features) if product.features else []
-            except:
-                features = []
-            
+        for product in rows:
             product_list.append({
                 "id": product.id,
                 "name": product.name,
@@ -167,20 +213,18 @@ async def list_products(
                 "category": product.category,
                 "price": float(product.price),
                 "mrp": float(product.mrp) if product.mrp else float(product.price),
-                "rating": float(product.rating),
+                "rating": float(product.sort_rating),
                 "review_count": product.review_count,
-                "features": features[:3]
+                "features": _top_features(product.features)
             })
         
         return {
             "success": True,
             "total": total,
             "limit": limit,
-            "offset": offset,
+            "next_cursor": {"rating": rows[-1].sort_rating, "id": rows[-1].id} if has_more else None,
             "products": product_list
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
@@ -3,9 +3,12 @@ User Profile Management Routes
 Handles user profile updates, password changes, and account management
 """
 
+from anyio import to_thread
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, validator
 from typing import Optional
 from datetime import datetime
 
@@ -103,8 +106,7 @@ class ProfileResponse(BaseModel):
     created_at: datetime
     last_login: Optional[datetime]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ProfileUpdateResponse(BaseModel):
@@ -212,36 +214,36 @@ async def update_profile(
             detail="At least one field (full_name or username) must be provided"
         )
     
+    values = {}
+    
     # Update full name if provided
     if request.full_name is not None:
-        current_user.full_name = request.full_name
-    
-    # Update username if provided
-    if request.username is not None:
-        # Check if username is different from current
-        if request.username != current_user.username:
-            # Check if username is already taken
-            existing_user = db.query(User).filter(
-                User.username == request.username,
-                User.id != current_user.id
-            ).first()
-            
-            if existing_user:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Username already taken"
-                )
-            
-            current_user.username = request.username
-    
-    # Save changes
-    db.commit()
-    db.refresh(current_user)
+        values["full_name"] = request.full_name
+    
+    # Update username if provided and different from current
+    if request.username is not None and request.username != current_user.username:
+        values["username"] = request.username
+    
+    # Single UPDATE; the unique constraint on username rejects taken names
+    # (no separate availability SELECT, no check-then-write race).
+    # The ORM update also syncs the new values onto current_user.
+    if values:
+        try:
+            db.execute(
+                update(User).where(User.id == current_user.id).values(**values)
+            )
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail="Username already taken"
+            )
     
     return ProfileUpdateResponse(
         success=True,
         message="Profile updated successfully",
-        user=ProfileResponse.from_orm(current_user)
+        user=ProfileResponse.model_validate(current_user)
     )
 
 
@@ -289,21 +291,22 @@ async def change_password(
     ```
     """
     # Verify current password
-    if not PasswordHasher.verify_password(request.current_password, current_user.password_hash):
+    if not await to_thread.run_sync(PasswordHasher.verify_password, request.current_password, current_user.password_hash):
         raise HTTPException(
             status_code=401,
             detail="Current password is incorrect"
         )
     
     # Check if new password is different from current
-    if PasswordHasher.verify_password(request.new_password, current_user.password_hash):
+    if await to_thread.run_sync(PasswordHasher.verify_password, request.new_password, current_user.password_hash):
         raise HTTPException(
             status_code=400,
             detail="New password must be different from current password"
         )
     
-    # Hash and update password
-    new_password_hash = PasswordHasher.hash_password(request.new_password)
+    # Hash and update password (bcrypt runs in a worker thread so it
+    # doesn't stall the event loop)
+    new_password_hash = await to_thread.run_sync(PasswordHasher.hash_password, request.new_password)
     current_user.password_hash = new_password_hash
     
     # Save changes
@@ -359,7 +362,7 @@ async def delete_account(
     ```
     """
     # Verify password
-    if not PasswordHasher.verify_password(request.password, current_user.password_hash):
+    if not await to_thread.run_sync(PasswordHasher.verify_password, request.password, current_user.password_hash):
         raise HTTPException(
             status_code=401,
             detail="Password is incorrect"
@@ -1,17 +1,37 @@
 # src/routes/recommendations.py
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Callable, List, Optional
+from itertools import islice
+import asyncio
 
-from src.database.connection import get_db
+from src.database.connection import get_db, SessionLocal
 from src.database.models import User
 from src.utils.middleware import get_current_user
-from src.services.recommendation_engine import HybridRecommendationEngine
+from src.services.recommendation_engine import recommendation_engine
+from src.services.trending_refresher import get_trending
+from src.services.cache_manager import cached
+from src.utils.etag import etag_response
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
+async def _run_with_session(call: Callable[[Session], Any]) -> Any:
+    """
+    Run an engine call in a worker thread with its own Session
+    (Sessions are not thread-safe, so concurrent calls can't share one)
+    """
+    def _run():
+        db = SessionLocal()
+        try:
+            return call(db)
+        finally:
+            db.close()
+    
+    return await asyncio.to_thread(_run)
+
 @router.get("/personalized")
 async def get_personalized_recommendations(
+    request: Request,
     limit: int = Query(20, ge=1, le=100),
     strategy: str = Query('hybrid', regex='^(content|collaborative|hybrid)$'),
     db: Session = Depends(get_db),
@@ -34,24 +54,24 @@ async def get_personalized_recommendations(
     
     **Returns:** List of recommended products with scores
     """
-    engine = HybridRecommendationEngine(db)
-    recommendations = engine.get_personalized_recommendations(
+    recommendations = recommendation_engine.get_personalized_recommendations(
+        db=db,
         user_id=current_user.id,
         limit=limit,
         strategy=strategy
     )
     
-    return {
+    return etag_response(request, {
         "user_id": current_user.id,
         "strategy": strategy,
         "count": len(recommendations),
         "recommendations": recommendations
-    }
+    }, cache_control="private, no-cache")
 
 @router.get("/trending")
 async def get_trending_products(
-    limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db)
+    request: Request,
+    limit: int = Query(10, ge=1, le=50)
 ):
     """
     Get trending products based on recent user interactions.
@@ -61,19 +81,21 @@ async def get_trending_products(
     - Wishlist additions
     - View counts
     
+    Refreshed every minute in the background (see trending_refresher).
+    
     **Parameters:**
     - **limit**: Number of trending products (1-50)
     """
-    engine = HybridRecommendationEngine(db)
-    trending = engine.get_trending_products(limit=limit)
+    trending = await get_trending(limit)
     
-    return {
+    return etag_response(request, {
         "count": len(trending),
         "trending_products": trending
-    }
+    }, cache_control="public, max-age=60")
 
 @router.get("/category/{category}")
 async def get_category_recommendations(
+    request: Request,
     category: str,
     limit: int = Query(10, ge=1, le=50),
     db: Session = Depends(get_db),
@@ -89,68 +111,75 @@ async def get_category_recommendations(
     - **category**: Product category
     - **limit**: Number of recommendations (1-50)
     """
-    engine = HybridRecommendationEngine(db)
-    recommendations = engine.get_category_recommendations(
+    recommendations = recommendation_engine.get_category_recommendations(
+        db=db,
         user_id=current_user.id,
         category=category,
         limit=limit
     )
     
-    return {
+    return etag_response(request, {
         "user_id": current_user.id,
         "category": category,
         "count": len(recommendations),
         "recommendations": recommendations
-    }
+    }, cache_control="private, no-cache")
+
+@cached(prefix='recommendations:similar', ttl=600)
+async def _get_similar_products(product_id: int, limit: int) -> List[dict]:
+    """Serialized similar products (own session in a worker thread, only on cache miss)"""
+    def _load(db: Session) -> List[dict]:
+        similar_products = recommendation_engine.content_filter.get_similar_products(
+            db=db,
+            product_id=product_id,
+            limit=limit
+        )
+        return [
+            {
+                'product_id': product.id,
+                'name': product.name,
+                'brand': product.brand,
+                'category': product.category,
+                'price': float(product.price),
+                'rating': float(product.rating) if product.rating else 0.0,
+                'image_url': product.image_url,
+                'similarity_score': round(similarity_score, 3),
+                'in_stock': product.in_stock
+            }
+            for product, similarity_score in similar_products
+        ]
+    
+    return await _run_with_session(_load)
 
 @router.get("/similar/{product_id}")
 async def get_similar_products(
+    request: Request,
     product_id: int,
-    limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db)
+    limit: int = Query(10, ge=1, le=50)
 ):
     """
     Get products similar to a specific product.
     
-    Uses content-based filtering to find products with similar:
-    - Category
-    - Brand
-    - Price range
-    - Features
+    Ranks products in the same category by embedding (cosine) similarity,
+    falling back to matching category, brand, price range and rating
+    for products without an embedding. Cached for 10 minutes; a DB
+    session is only checked out on a cache miss.
     
     **Parameters:**
     - **product_id**: ID of the base product
     - **limit**: Number of similar products (1-50)
     """
-    engine = HybridRecommendationEngine(db)
-    similar_products = engine.content_filter.get_similar_products(
-        product_id=product_id,
-        limit=limit
-    )
+    result = await _get_similar_products(product_id, limit)
     
-    result = []
-    for product, similarity_score in similar_products:
-        result.append({
-            'product_id': product.id,
-            'name': product.name,
-            'brand': product.brand,
-            'category': product.category,
-            'price': float(product.price),
-            'rating': float(product.rating) if product.rating else 0.0,
-            'image_url': product.image_url,
-            'similarity_score': round(similarity_score, 3),
-            'in_stock': product.in_stock
-        })
-    
-    return {
+    return etag_response(request, {
         "base_product_id": product_id,
         "count": len(result),
         "similar_products": result
-    }
+    })
 
 @router.get("/for-you")
 async def get_for_you_recommendations(
-    db: Session = Depends(get_db),
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -163,32 +192,42 @@ async def get_for_you_recommendations(
     
     **Returns:** Curated collection of recommendations
     """
-    engine = HybridRecommendationEngine(db)
-    
-    # Get personalized recommendations
-    personalized = engine.get_personalized_recommendations(
-        user_id=current_user.id,
-        limit=15,
-        strategy='hybrid'
-    )
+    user_id = current_user.id
     
-    # Get trending products
-    trending = engine.get_trending_products(limit=10)
+    # Load the user's wishlist and conversation context once for all sections
+    user_ctx = await _run_with_session(lambda db: recommendation_engine.build_user_context(db, user_id))
+    memory_context = user_ctx.memory_context
+    categories = memory_context['mentioned_categories'][:3]
     
-    # Get memory context for category suggestions
-    memory_context = engine.get_agent_memory_context(current_user.id)
+    # Personalized, trending and per-category sections are independent - run them concurrently
+    personalized, trending, *category_results = await asyncio.gather(
+        _run_with_session(lambda db: recommendation_engine.get_personalized_recommendations(
+            db=db,
+            user_id=user_id,
+            limit=15,
+            strategy='hybrid',
+            user_ctx=user_ctx
+        )),
+        get_trending(10),
+        *[
+            _run_with_session(lambda db, category=category: recommendation_engine.get_category_recommendations(
+                db=db,
+                user_id=user_id,
+                category=category,
+                limit=5,
+                user_ctx=user_ctx
+            ))
+            for category in categories
+        ]
+    )
     
-    category_recommendations = {}
-    for category in memory_context['mentioned_categories'][:3]:
-        cat_recs = engine.get_category_recommendations(
-            user_id=current_user.id,
-            category=category,
-            limit=5
-        )
-        if cat_recs:
-            category_recommendations[category] = cat_recs
+    category_recommendations = {
+        category: cat_recs
+        for category, cat_recs in zip(categories, category_results)
+        if cat_recs
+    }
     
-    return {
+    return etag_response(request, {
         "user_id": current_user.id,
         "personalized_recommendations": {
             "count": len(personalized),
@@ -201,12 +240,13 @@ async def get_for_you_recommendations(
         "category_recommendations": category_recommendations,
         "user_insights": {
             "recent_interests": memory_context['mentioned_categories'],
-            "recent_intents": memory_context['recent_intents'][:5]
+            "recent_intents": list(islice(memory_context['recent_intents'], 5))
         }
-    }
+    }, cache_control="private, no-cache")
 
 @router.get("/insights")
 async def get_recommendation_insights(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -215,18 +255,17 @@ async def get_recommendation_insights(
     
     Helps understand why certain products are recommended.
     """
-    engine = HybridRecommendationEngine(db)
-    
     # Get agent memory
-    memory_context = engine.get_agent_memory_context(current_user.id)
+    memory_context = recommendation_engine.get_agent_memory_context(db, current_user.id)
     
     # Get similar users
-    similar_users = engine.collab_filter.find_similar_users(
+    similar_users = recommendation_engine.collab_filter.find_similar_users(
+        db=db,
         user_id=current_user.id,
         limit=5
     )
     
-    return {
+    return etag_response(request, {
         "user_id": current_user.id,
         "memory_context": {
             "recent_intents": memory_context['recent_intents'],
@@ -240,4 +279,4 @@ async def get_recommendation_insights(
             "search_history": "Past searches help identify preferences",
             "similar_users": "Recommendations based on users with similar tastes"
         }
-    }
+    }, cache_control="private, no-cache")
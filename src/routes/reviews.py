@@ -3,15 +3,35 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from src.database.connection import get_db
 from src.agents.review_analyzer_agent import review_analyzer_agent
+from src.services.cache_manager import cached
 from typing import Dict
+import asyncio
 
 router = APIRouter()
 
+# At most this many review analyses (LLM calls) run at once per worker;
+# the rest queue here instead of piling onto Ollama. Only the agent call
+# takes a slot: cache hits return before it, concurrent misses for one
+# product share a single call, and background stale refreshes queue like misses
+ANALYSIS_CONCURRENCY = 4
+_analysis_slots = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+
+@cached(prefix='reviews:analyze', ttl=3600)
+async def _analyze_reviews(product_id: int) -> Dict:
+    """Bounded, shared-cache review analysis (failures raise, so they are never cached)"""
+    async with _analysis_slots:
+        result = await review_analyzer_agent.analyze_reviews(product_id)
+    
+    if not result['success']:
+        raise HTTPException(
+            status_code=404 if "not found" in result.get('message', '').lower() else 500,
+            detail=result.get('message') or result.get('error', 'Analysis failed')
+        )
+    
+    return result
+
 @router.get("/api/reviews/analyze/{product_id}")
-async def analyze_product_reviews(
-    product_id: int,
-    db: Session = Depends(get_db)
-) -> Dict:
+async def analyze_product_reviews(product_id: int) -> Dict:
     """
     Analyze reviews for a specific product
     
@@ -36,15 +56,7 @@ async def analyze_product_reviews(
             "statistics": {...}
         }
     """
-    result = await review_analyzer_agent.analyze_reviews(product_id)
-    
-    if not result['success']:
-        raise HTTPException(
-            status_code=404 if "not found" in result.get('message', '').lower() else 500,
-            detail=result.get('message') or result.get('error', 'Analysis failed')
-        )
-    
-    return result
+    return await _analyze_reviews(product_id)
 
 @router.get("/api/reviews/{product_id}")
 async def get_product_reviews(
@@ -64,17 +76,12 @@ async def get_product_reviews(
     """
     from src.tools.review_tools import review_tools
     
-    reviews = await review_tools.get_reviews(
+    reviews, stats = await review_tools.get_reviews_with_statistics(
         db=db,
         product_id=product_id,
         limit=limit
     )
     
-    stats = await review_tools.get_review_statistics(
-        db=db,
-        product_id=product_id
-    )
-    
     return {
         "success": True,
         "product_id": product_id,
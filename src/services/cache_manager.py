@@ -1,17 +1,44 @@
 # src/services/cache_manager.py
 """
 Production-ready caching system for performance optimization
+
+Backed by Redis (shared by all uvicorn workers) with msgpack-encoded values.
+If Redis is unavailable every lookup is a miss and writes are no-ops.
 """
 
-from typing import Any, Optional, Callable
+from typing import Any, Dict, List, Optional, Callable, Tuple
 from functools import wraps
-from datetime import datetime, timedelta
-import json
-import hashlib
+import asyncio
+import logging
+import threading
+import time
+
+import msgpack
+import numpy as np
+import orjson
+import xxhash
+
+try:
+    import faiss
+except ImportError:  # Optional - similarity search falls back to brute force
+    faiss = None
+
+try:
+    from src.services.kernels import topk_cosine
+except ImportError:  # Optional - brute force falls back to NumPy
+    topk_cosine = None
+
+from src.utils.redis_cache import get_redis, _mark_down
+
+logger = logging.getLogger(__name__)
+
+
+def _msgpack_default(obj: Any):
+    """msgpack fallback for Pydantic models and other non-native types"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
 
-# Simple in-memory cache (In production, use Redis)
-_cache = {}
-_cache_timestamps = {}
 
 class CacheManager:
     """Cache manager for recommendation system"""
@@ -19,89 +46,379 @@ class CacheManager:
     def __init__(self, default_ttl: int = 300):  # 5 minutes default
         self.default_ttl = default_ttl
     
-    def _generate_key(self, prefix: str, **kwargs) -> str:
-        """Generate cache key from parameters"""
-        params_str = json.dumps(kwargs, sort_keys=True)
-        hash_suffix = hashlib.md5(params_str.encode()).hexdigest()[:8]
-        return f"{prefix}:{hash_suffix}"
+    def _generate_key(self, prefix: str, args: tuple = (), kwargs: Optional[dict] = None) -> str:
+        """
+        Generate cache key from parameters (xxh3 over canonical orjson bytes)
+        
+        Raises TypeError for arguments that aren't JSON-serializable (sessions,
+        models, ...) - their repr() would differ per call and never hit again
+        """
+        try:
+            key_bytes = orjson.dumps(
+                (args, kwargs or {}),
+                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+            )
+        except orjson.JSONEncodeError as e:
+            raise TypeError(f"Cache key arguments for '{prefix}' must be JSON-serializable: {e}") from e
+        return f"{prefix}:{xxhash.xxh3_64_hexdigest(key_bytes)}"
     
-    def get(self, key: str) -> Optional[Any]:
+    async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
-        if key in _cache:
-            # Check if expired
-            if key in _cache_timestamps:
-                if datetime.utcnow() > _cache_timestamps[key]:
-                    # Expired
-                    del _cache[key]
-                    del _cache_timestamps[key]
-                    return None
-            return _cache[key]
-        return None
-    
-    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            packed = await client.get(key)
+        except Exception as e:
+            _mark_down(e)
+            return None
+        if packed is None:
+            return None
+        try:
+            # strict_map_key=False: cached values may have int dict keys (e.g. rating distributions)
+            return msgpack.unpackb(packed, raw=False, strict_map_key=False)
+        except Exception as e:
+            logger.warning(f"Undecodable cache entry {key}: {e}")
+            return None
+    
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
         """Set value in cache with TTL"""
-        _cache[key] = value
+        client = get_redis()
+        if client is None:
+            return
         ttl = ttl or self.default_ttl
-        _cache_timestamps[key] = datetime.utcnow() + timedelta(seconds=ttl)
+        try:
+            await client.setex(key, ttl, msgpack.packb(value, default=_msgpack_default))
+        except Exception as e:
+            _mark_down(e)
     
-    def delete(self, key: str):
+    async def delete(self, key: str):
         """Delete key from cache"""
-        if key in _cache:
-            del _cache[key]
-        if key in _cache_timestamps:
-            del _cache_timestamps[key]
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            await client.unlink(key)
+        except Exception as e:
+            _mark_down(e)
     
-    def clear_all(self):
-        """Clear entire cache"""
-        _cache.clear()
-        _cache_timestamps.clear()
+    async def clear_all(self):
+        """Clear entire cache (current Redis database)"""
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            await client.flushdb(asynchronous=True)
+        except Exception as e:
+            _mark_down(e)
     
-    def clear_prefix(self, prefix: str):
+    async def clear_prefix(self, prefix: str):
         """Clear all keys with given prefix"""
-        keys_to_delete = [k for k in _cache.keys() if k.startswith(prefix)]
-        for key in keys_to_delete:
-            self.delete(key)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            # SCAN instead of KEYS so Redis is never blocked on a full keyspace walk
+            batch = []
+            async for key in client.scan_iter(match=f"{prefix}*", count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    await client.unlink(*batch)
+                    batch = []
+            if batch:
+                await client.unlink(*batch)
+        except Exception as e:
+            _mark_down(e)
 
 # Global cache instance
 cache = CacheManager()
 
-def cached(prefix: str, ttl: int = 300):
+# Keys whose stale value is being recomputed by this worker, and the tasks doing it
+# (the event loop is single-threaded, so no lock is needed around the check-and-add)
+_refreshing = set()
+_refresh_tasks = set()
+
+# Misses being computed by this worker: cache key -> future of the result
+_inflight: Dict[str, asyncio.Future] = {}
+
+async def _single_flight(cache_key: str, compute: Callable):
+    """
+    Run compute() once per key at a time - concurrent callers for the same
+    key await the in-flight result instead of recomputing it
+    """
+    while True:
+        inflight = _inflight.get(cache_key)
+        if inflight is None:
+            break
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise  # this caller was cancelled
+            # The computing request was cancelled - retry, possibly as the new leader
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    try:
+        result = await compute()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved (no "never retrieved" warning without waiters)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(cache_key, None)
+
+def cached(prefix: str, ttl: int = 300, stale_ttl: Optional[int] = None):
     """
-    Decorator for caching function results
+    Decorator for caching function results (stale-while-revalidate)
+    
+    A result is fresh for `ttl` seconds, then served stale for up to
+    `stale_ttl` more seconds (default: ttl) while one background task
+    recomputes it - callers never wait on a recompute unless the entry
+    is missing or fully expired. Concurrent misses for the same key
+    share a single computation.
+    
+    The decorated function is always awaitable: coroutine functions are
+    awaited directly, plain functions run in a worker thread so they
+    don't block the event loop.
     
     Usage:
         @cached(prefix='recommendations', ttl=600)
-        def get_recommendations(user_id):
+        async def get_recommendations(user_id):
             # expensive operation
             return results
     """
+    hard_ttl = ttl + (ttl if stale_ttl is None else stale_ttl)
+    
     def decorator(func: Callable):
+        is_async = asyncio.iscoroutinefunction(func)
+        
+        async def compute_and_store(cache_key: str, args: tuple, kwargs: dict):
+            # Execute function
+            if is_async:
+                result = await func(*args, **kwargs)
+            else:
+                result = await asyncio.to_thread(func, *args, **kwargs)
+            
+            # Store in cache as [value, soft expiry in integer epoch seconds];
+            # Redis drops it at the hard expiry
+            await cache.set(cache_key, [result, int(time.time()) + ttl], ttl=hard_ttl)
+            
+            return result
+        
+        async def refresh(cache_key: str, args: tuple, kwargs: dict):
+            try:
+                await compute_and_store(cache_key, args, kwargs)
+            except Exception as e:
+                logger.warning(f"Background refresh of {cache_key} failed: {e}")
+            finally:
+                _refreshing.discard(cache_key)
+        
         @wraps(func)
-        def wrapper(*args, **kwargs):
+        async def wrapper(*args, **kwargs):
             # Generate cache key
             cache_key = cache._generate_key(prefix, args=args, kwargs=kwargs)
             
             # Try to get from cache
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
+            entry = await cache.get(cache_key)
+            if entry is not None:
+                value, soft_expire_ts = entry
+                if int(time.time()) > soft_expire_ts and cache_key not in _refreshing:
+                    # Stale: serve it now, recompute in the background
+                    _refreshing.add(cache_key)
+                    task = asyncio.create_task(refresh(cache_key, args, kwargs))
+                    _refresh_tasks.add(task)
+                    task.add_done_callback(_refresh_tasks.discard)
+                return value
             
-            # Execute function
-            result = func(*args, **kwargs)
-            
-            # Store in cache
-            cache.set(cache_key, result, ttl=ttl)
-            
-            return result
+            return await _single_flight(
+                cache_key, lambda: compute_and_store(cache_key, args, kwargs)
+            )
         
         return wrapper
     return decorator
 
-def invalidate_user_cache(user_id: int):
+# ==================== PRODUCT EMBEDDING MATRIX ====================
+
+# From this many products on, similarity search uses per-category HNSW
+# graphs (faiss) instead of scanning the whole matrix
+HNSW_MIN_PRODUCTS = 10_000
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 50
+
+class ProductEmbeddings:
+    """
+    Int8-quantized matrix of L2-normalized product embeddings (one row per product)
+    
+    Rows are quantized symmetrically with a per-row scale (s_i = max|E_i| / 127),
+    so the matrix takes a quarter of the float32 memory. Cosine similarity
+    against every product is a single int8 x int8 -> int32 matrix-vector
+    product, rescaled by s_i * s_query.
+    """
+    
+    def __init__(self, ids: List[int], categories: List[str], vectors: List[List[float]]):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.categories = np.asarray(categories)
+        self.id_to_row = {product_id: row for row, product_id in enumerate(ids)}
+        
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        
+        scales = np.abs(matrix).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        self.scales = scales.astype(np.float32)
+        self.quantized = np.round(matrix / self.scales[:, None]).astype(np.int8)
+        
+        # {category: (HNSW index, matrix rows in index order)}
+        self.hnsw = {}
+        if faiss is not None and len(ids) >= HNSW_MIN_PRODUCTS:
+            self._build_hnsw_indexes(matrix)
+    
+    def _build_hnsw_indexes(self, matrix: np.ndarray):
+        """Build one inner-product HNSW graph (8-bit scalar-quantized storage) per category"""
+        for category in np.unique(self.categories):
+            rows = np.flatnonzero(self.categories == category)
+            vectors = np.ascontiguousarray(matrix[rows])
+            
+            index = faiss.IndexHNSWSQ(
+                matrix.shape[1], faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
+            )
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.train(vectors)
+            index.add(vectors)
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            
+            self.hnsw[category] = (index, rows)
+        
+        logger.info(f"Built HNSW indexes for {len(self.hnsw)} categories")
+    
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self.id_to_row
+    
+    def most_similar(
+        self,
+        product_id: int,
+        k: int,
+        category: Optional[str] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (product_id, cosine similarity) for a product, best first,
+        excluding the product itself and (optionally) other categories
+        """
+        row = self.id_to_row[product_id]
+        
+        if category in self.hnsw:
+            return self._most_similar_hnsw(row, k, category)
+        
+        if topk_cosine is not None:
+            return self._most_similar_jit(row, k, category)
+        
+        # Integer dot products (einsum accumulates in int32 without an int32 copy of the matrix)
+        raw = np.einsum('ij,j->i', self.quantized, self.quantized[row].astype(np.int32))
+        # Per-row scales differ, so they must be applied before ranking;
+        # the query scale is common to all rows and only applied to the results
+        scores = raw * self.scales
+        
+        scores[row] = -np.inf
+        if category is not None:
+            scores[self.categories != category] = -np.inf
+        
+        # Partial selection of the k best, then sort only those
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        
+        query_scale = self.scales[row]
+        return [
+            (int(self.ids[i]), float(scores[i] * query_scale))
+            for i in top
+            if np.isfinite(scores[i])
+        ]
+
+    def _most_similar_jit(self, row: int, k: int, category: Optional[str]) -> List[Tuple[int, float]]:
+        """Exact top-k with the Numba kernel (parallel scoring + bounded heap, no full sort)"""
+        if category is not None:
+            mask = self.categories == category
+        else:
+            mask = np.ones(len(self.ids), dtype=np.bool_)
+        mask[row] = False
+        
+        rows, scores = topk_cosine(self.quantized, self.scales, self.quantized[row], mask, min(k, len(self.ids)))
+        
+        query_scale = self.scales[row]
+        return [
+            (int(self.ids[r]), float(score * query_scale))
+            for r, score in zip(rows, scores)
+            if r >= 0
+        ]
+    
+    def _most_similar_hnsw(self, row: int, k: int, category: str) -> List[Tuple[int, float]]:
+        """Approximate top-k within a category via its HNSW graph"""
+        index, rows = self.hnsw[category]
+        query = (self.quantized[row] * self.scales[row]).astype(np.float32)[None, :]
+        
+        # One extra neighbour: the product itself is usually its own nearest match
+        scores, neighbors = index.search(query, min(k + 1, len(rows)))
+        
+        return [
+            (int(self.ids[rows[n]]), float(score))
+            for n, score in zip(neighbors[0], scores[0])
+            if n >= 0 and rows[n] != row
+        ][:k]
+
+_product_embeddings = None
+_product_embeddings_lock = threading.Lock()
+
+def get_product_embedding_matrix() -> Optional[ProductEmbeddings]:
+    """
+    Get this worker's product embedding matrix, loading it from the vector DB
+    on first use (None if the vector DB is empty or unavailable)
+    """
+    global _product_embeddings
+    if _product_embeddings is not None:
+        return _product_embeddings
+    
+    with _product_embeddings_lock:
+        if _product_embeddings is None:
+            from src.database.setup_vector_db import get_products_collection
+            
+            try:
+                data = get_products_collection().get(include=["embeddings", "metadatas"])
+            except Exception as e:
+                logger.warning(f"Could not load product embeddings: {e}")
+                return None
+            
+            if not len(data["ids"]):
+                return None
+            
+            _product_embeddings = ProductEmbeddings(
+                ids=[int(product_id) for product_id in data["ids"]],
+                categories=[metadata.get("category") or "" for metadata in data["metadatas"]],
+                vectors=data["embeddings"]
+            )
+            logger.info(f"Loaded embedding matrix for {len(data['ids'])} products")
+    
+    return _product_embeddings
+
+async def invalidate_user_cache(user_id: int):
     """Invalidate all cache entries for a user"""
-    cache.clear_prefix(f'user:{user_id}')
-    cache.clear_prefix(f'recommendations:user:{user_id}')
+    await cache.clear_prefix(f'user:{user_id}')
+    await cache.clear_prefix(f'recommendations:user:{user_id}')
 
-def invalidate_product_cache(product_id: int):
+async def invalidate_product_cache(product_id: int):
     """Invalidate all cache entries for a product"""
-    cache.clear_prefix(f'product:{product_id}')
+    global _product_embeddings
+    await cache.clear_prefix(f'product:{product_id}')
+    # Rebuilt from the vector DB on next use
+    _product_embeddings = None
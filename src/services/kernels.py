@@ -0,0 +1,83 @@
+# src/services/kernels.py
+"""
+Numba-compiled kernels for product similarity search
+
+Compiled on first call (cached on disk via cache=True); call warmup()
+on startup so no request pays the JIT compile time.
+"""
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _masked_scores(quantized, scales, query, mask):
+    """Scaled int8 dot product of every allowed row with the query (rows in parallel)"""
+    n, d = quantized.shape
+    scores = np.zeros(n, dtype=np.float32)
+    for i in prange(n):
+        if mask[i]:
+            acc = 0
+            for j in range(d):
+                acc += np.int32(quantized[i, j]) * np.int32(query[j])
+            scores[i] = acc * scales[i]
+    return scores
+
+
+@njit(cache=True)
+def _top_k(scores, mask, k):
+    """Best k allowed rows via a fixed-size min-heap, best first (row -1 = unfilled)"""
+    # -inf: scores exclude the query's scale, so they are not bounded like cosines
+    heap_scores = np.full(k, -np.inf, dtype=np.float32)
+    heap_rows = np.full(k, -1, dtype=np.int64)
+    
+    for i in range(len(scores)):
+        if not mask[i] or scores[i] <= heap_scores[0]:
+            continue
+        
+        # Replace the heap minimum and sift it down
+        heap_scores[0] = scores[i]
+        heap_rows[0] = i
+        pos = 0
+        while True:
+            child = 2 * pos + 1
+            if child >= k:
+                break
+            if child + 1 < k and heap_scores[child + 1] < heap_scores[child]:
+                child += 1
+            if heap_scores[child] >= heap_scores[pos]:
+                break
+            heap_scores[pos], heap_scores[child] = heap_scores[child], heap_scores[pos]
+            heap_rows[pos], heap_rows[child] = heap_rows[child], heap_rows[pos]
+            pos = child
+    
+    order = np.argsort(-heap_scores)
+    return heap_rows[order], heap_scores[order]
+
+
+@njit(cache=True)
+def topk_cosine(quantized, scales, query, mask, k):
+    """
+    Top-k rows of an int8-quantized embedding matrix by similarity to `query`
+    
+    Args:
+        quantized: int8[:, :] quantized rows
+        scales: float32[:] per-row dequantization scales
+        query: int8[:] quantized query row
+        mask: bool[:] rows allowed in the result
+        k: number of results (>= 1)
+    
+    Returns:
+        (rows, scores) best first; scores exclude the query's own scale;
+        rows of -1 mark unfilled slots when fewer than k rows are allowed
+    """
+    scores = _masked_scores(quantized, scales, query, mask)
+    return _top_k(scores, mask, k)
+
+
+def warmup():
+    """Compile (or load from cache) the kernels with a tiny synthetic input"""
+    quantized = np.ones((4, 8), dtype=np.int8)
+    scales = np.ones(4, dtype=np.float32)
+    mask = np.ones(4, dtype=np.bool_)
+    topk_cosine(quantized, scales, quantized[0], mask, 2)
@@ -4,26 +4,247 @@ Production-Ready Recommendation Engine
 Combines content-based and collaborative filtering with agent memory
 """
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List, Dict, Optional, Tuple
-from collections import Counter, defaultdict
-import json
-import math
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import and_, case, func, desc, literal, select, true, union_all
+from scipy.sparse import csr_matrix, diags
+from typing import List, Dict, Optional, Set, Tuple
+from collections import Counter
+from dataclasses import dataclass, field
+import numpy as np
+import orjson
+import threading
+import time
 from datetime import datetime, timedelta
 
 from src.database.models import (
     Product, User, Wishlist, SearchHistory, 
     ConversationHistory, UserInteraction, Review
 )
+from src.services.cache_manager import get_product_embedding_matrix
+
+try:
+    import ahocorasick
+except ImportError:  # Optional - brand matching falls back to one substring search per brand
+    ahocorasick = None
+
+# Product columns needed to score and render a recommendation
+RECOMMENDATION_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.brand,
+    Product.category,
+    Product.subcategory,
+    Product.price,
+    Product.rating,
+    Product.image_url,
+    Product.in_stock,
+)
+
+# Categories picked up from conversation messages for the memory context
+MEMORY_CATEGORIES = ('laptop', 'phone', 'headphone', 'camera', 'watch')
+
+# Upper bounds of the budget / mid-range / premium price ranges (above: luxury)
+PRICE_BINS = np.array([5000.0, 15000.0, 50000.0])
+
+# Feature weights of ContentBasedFilter.calculate_similarity
+CATEGORY_WEIGHT = 0.4
+SUBCATEGORY_WEIGHT = 0.2
+BRAND_WEIGHT = 0.15
+PRICE_RANGE_WEIGHT = 0.15
+RATING_WEIGHT = 0.1
+
+
+@dataclass
+class ProductFeatureMatrix:
+    """
+    Sparse int8 products x features indicator matrix; similarity(a, b) =
+    (row a * column_weights) . row b equals ContentBasedFilter.calculate_similarity
+    (row i is product product_ids[i])
+    
+    Columns are one-hot category, (category, subcategory), brand and price
+    range, weighted by the feature weight, plus a two-sided thermometer code
+    of the rounded rating: for k in 0..4 a row sets either "rating > k" or
+    "rating <= k", so two rows share min(a, b) + 5 - max(a, b) = 5 - |a - b|
+    of them; at RATING_WEIGHT / 5 each that is RATING_WEIGHT * (1 - |a - b| / 5).
+    """
+    matrix: csr_matrix
+    column_weights: np.ndarray
+    product_ids: np.ndarray
+    product_rows: Dict[int, int]
+    category_codes: np.ndarray
+    in_stock: np.ndarray
+
+
+# Similar products counted per wishlist item when aggregating wishlist recommendations
+WISHLIST_MATCHES_PER_ITEM = 20
+
+# Rows fetched per round-trip when streaming interactions into the user-product matrix
+INTERACTION_BATCH_SIZE = 10_000
+
+# Rebuild the cached user-product matrix at least this often, even if the
+# staleness token is unchanged (in-place edits such as review rating changes)
+MATRIX_MAX_AGE_SECONDS = 600
+
+# From this many users on, find_similar_users only reranks the users that
+# share an LSH bucket with the query user instead of scanning all of them
+LSH_MIN_USERS = 5_000
+LSH_PROJECTIONS = 64
+LSH_TABLES = 8
+
+
+class UserLSHIndex:
+    """
+    Signed random projection LSH over user interaction rows
+    
+    Each row is hashed to LSH_PROJECTIONS sign bits (the side of a random
+    hyperplane it falls on, which only depends on its direction, so rows
+    with a high cosine similarity agree on most bits). The signature is cut
+    into LSH_TABLES bands; users sharing any band are candidates.
+    """
+    
+    def __init__(self, matrix: csr_matrix, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.projections = rng.standard_normal(
+            (LSH_PROJECTIONS, matrix.shape[1])
+        ).astype(np.float32)
+        
+        # {band key: user rows} per table
+        self.tables: List[Dict[int, np.ndarray]] = []
+        band_keys = self._band_keys(matrix)
+        for table in range(LSH_TABLES):
+            keys = band_keys[:, table]
+            order = np.argsort(keys, kind='stable')
+            unique_keys, starts = np.unique(keys[order], return_index=True)
+            self.tables.append(dict(zip(unique_keys.tolist(), np.split(order, starts[1:]))))
+    
+    def _band_keys(self, rows: csr_matrix) -> np.ndarray:
+        """(n, LSH_TABLES) integer key of each band of each row's signature"""
+        signs = np.asarray(rows @ self.projections.T) > 0
+        signature = np.packbits(signs, axis=1)  # (n, LSH_PROJECTIONS / 8) uint8
+        bands = signature.reshape(len(signature), LSH_TABLES, -1).astype(np.uint64)
+        weights = np.uint64(256) ** np.arange(bands.shape[2], dtype=np.uint64)
+        return (bands * weights).sum(axis=2)
+    
+    def candidates(self, row: csr_matrix) -> np.ndarray:
+        """Rows sharing at least one band with `row` (including itself if indexed)"""
+        keys = self._band_keys(row)[0]
+        buckets = [
+            self.tables[table].get(int(key))
+            for table, key in enumerate(keys)
+        ]
+        buckets = [bucket for bucket in buckets if bucket is not None]
+        if not buckets:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(buckets))
+
+
+@dataclass
+class UserProductMatrix:
+    """
+    Sparse users x products interaction matrix with its index maps
+    (row i is user user_ids[i], column j is product product_ids[j]);
+    `normalized` has unit-length rows, so cosine similarity is a dot product
+    """
+    matrix: csr_matrix
+    normalized: csr_matrix
+    user_ids: np.ndarray
+    product_ids: np.ndarray
+    user_rows: Dict[int, int]
+    lsh: Optional[UserLSHIndex] = None
+
+
+@dataclass
+class UserContext:
+    """
+    Per-request snapshot of a user's signals, loaded once by
+    HybridRecommendationEngine.build_user_context and shared by the
+    engine methods instead of each one re-querying them
+    """
+    user_id: int
+    wishlist_product_ids: List[int] = field(default_factory=list)
+    memory_context: Dict = field(default_factory=dict)
+    recent_messages: List[str] = field(default_factory=list)  # lowercased user messages
+
+def _equals(column, value):
+    """column == value, treating None as equal to NULL (like Python's ==)"""
+    return column.is_(None) if value is None else column == value
+
 
 class ContentBasedFilter:
     """
     Content-Based Filtering: Recommend similar products based on features
     """
     
-    def __init__(self, db: Session):
-        self.db = db
+    def __init__(self):
+        # Last built feature matrix, reused until a product is added or updated
+        self._features_cache: Optional[ProductFeatureMatrix] = None
+        self._features_token: Optional[Tuple] = None
+        self._features_lock = threading.Lock()
+    
+    def _build_feature_matrix(self, db: Session) -> ProductFeatureMatrix:
+        """One-hot encode every product's features (see ProductFeatureMatrix)"""
+        rows = db.query(
+            Product.id, Product.category, Product.subcategory, Product.brand,
+            Product.price, Product.rating, Product.in_stock
+        ).all()
+        n = len(rows)
+        
+        def codes(values) -> np.ndarray:
+            index = {}
+            return np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int64, count=n)
+        
+        category_codes = codes(row.category for row in rows)
+        one_hot_blocks = [
+            (category_codes, CATEGORY_WEIGHT),
+            (codes((row.category, row.subcategory) for row in rows), SUBCATEGORY_WEIGHT),
+            (codes(row.brand for row in rows), BRAND_WEIGHT),
+            (self._price_bucket(np.fromiter((row.price for row in rows), dtype=np.float64, count=n)), PRICE_RANGE_WEIGHT),
+        ]
+        ratings = np.rint(np.fromiter((row.rating or 0 for row in rows), dtype=np.float64, count=n))
+        
+        col_index, column_weights = [], []
+        offset = 0
+        for block_codes, weight in one_hot_blocks:
+            width = int(block_codes.max()) + 1 if n else 0
+            col_index.append(block_codes + offset)
+            column_weights.append(np.full(width, weight, dtype=np.float32))
+            offset += width
+        for k in range(5):
+            col_index.append(offset + 2 * k + (ratings > k))
+        column_weights.append(np.full(10, RATING_WEIGHT / 5, dtype=np.float32))
+        offset += 10
+        
+        # 0/1 indicators stored as int8 with int32 indexes (weights are applied to the query side)
+        matrix = csr_matrix(
+            (
+                np.ones(n * len(col_index), dtype=np.int8),
+                (
+                    np.tile(np.arange(n, dtype=np.int32), len(col_index)),
+                    np.concatenate(col_index).astype(np.int32)
+                )
+            ),
+            shape=(n, offset)
+        )
+        product_ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=n)
+        
+        return ProductFeatureMatrix(
+            matrix=matrix,
+            column_weights=np.concatenate(column_weights),
+            product_ids=product_ids,
+            product_rows={int(product_id): i for i, product_id in enumerate(product_ids)},
+            category_codes=category_codes,
+            in_stock=np.fromiter((bool(row.in_stock) for row in rows), dtype=bool, count=n)
+        )
+    
+    def get_feature_matrix(self, db: Session) -> ProductFeatureMatrix:
+        """Product feature matrix (cached until a product is added, removed or updated)"""
+        token = tuple(db.query(func.count(Product.id), func.max(Product.updated_at)).one())
+        
+        with self._features_lock:
+            if self._features_cache is None or self._features_token != token:
+                self._features_cache = self._build_feature_matrix(db)
+                self._features_token = token
+            return self._features_cache
     
     def get_product_features(self, product: Product) -> Dict:
         """Extract features from a product"""
@@ -31,20 +252,13 @@ class ContentBasedFilter:
             'category': product.category,
             'subcategory': product.subcategory,
             'brand': product.brand,
-            'price_range': self._get_price_range(product.price),
+            'price_range': int(self._price_bucket(product.price)),
             'rating': round(product.rating) if product.rating else 0
         }
     
-    def _get_price_range(self, price: float) -> str:
-        """Categorize price into ranges"""
-        if price < 5000:
-            return 'budget'
-        elif price < 15000:
-            return 'mid_range'
-        elif price < 50000:
-            return 'premium'
-        else:
-            return 'luxury'
+    def _price_bucket(self, prices: np.ndarray) -> np.ndarray:
+        """Price range index of each price (0 budget, 1 mid-range, 2 premium, 3 luxury)"""
+        return np.searchsorted(PRICE_BINS, prices, side='right')
     
     def calculate_similarity(self, product1: Product, product2: Product) -> float:
         """
@@ -60,28 +274,29 @@ class ContentBasedFilter:
         
         # Category match (highest weight)
         if features1['category'] == features2['category']:
-            score += 0.4
+            score += CATEGORY_WEIGHT
             
             # Subcategory match (within same category)
             if features1['subcategory'] == features2['subcategory']:
-                score += 0.2
+                score += SUBCATEGORY_WEIGHT
         
         # Brand match
         if features1['brand'] == features2['brand']:
-            score += 0.15
+            score += BRAND_WEIGHT
         
         # Price range match
         if features1['price_range'] == features2['price_range']:
-            score += 0.15
+            score += PRICE_RANGE_WEIGHT
         
         # Rating similarity
         rating_diff = abs(features1['rating'] - features2['rating'])
-        score += (1 - rating_diff / 5) * 0.1
+        score += (1 - rating_diff / 5) * RATING_WEIGHT
         
         return min(score, 1.0)
     
     def get_similar_products(
-        self, 
+        self,
+        db: Session,
         product_id: int, 
         limit: int = 10,
         min_similarity: float = 0.3
@@ -90,68 +305,168 @@ class ContentBasedFilter:
         Get products similar to the given product
         Returns list of (product, similarity_score) tuples
         """
-        base_product = self.db.query(Product).filter(Product.id == product_id).first()
+        base_product = db.query(Product).filter(Product.id == product_id).first()
         if not base_product:
             return []
         
-        # Get products from same category for efficiency
-        candidates = self.db.query(Product).filter(
+        # Embedding cosine similarity (one matrix-vector product over the catalog)
+        embeddings = get_product_embedding_matrix()
+        if embeddings is not None and product_id in embeddings:
+            # Over-fetch so out-of-stock products can be dropped below
+            ranked = [
+                (similar_id, score)
+                for similar_id, score in embeddings.most_similar(
+                    product_id, k=limit * 2, category=base_product.category
+                )
+                if score >= min_similarity
+            ]
+            products_by_id = {
+                product.id: product
+                for product in db.query(Product).options(
+                    load_only(*RECOMMENDATION_COLUMNS)
+                ).filter(
+                    Product.id.in_([similar_id for similar_id, _ in ranked]),
+                    Product.in_stock == True
+                )
+            }
+            return [
+                (products_by_id[similar_id], score)
+                for similar_id, score in ranked
+                if similar_id in products_by_id
+            ][:limit]
+        
+        # Fallback: rule-based feature similarity (product not in the vector DB)
+        # The subcategory/brand/price-range matches are scored and ranked in
+        # SQL, so only the top candidates come back; the rating term (at most
+        # 0.1, less than any single match) orders ties and is added below
+        base = self.get_product_features(base_product)
+        price_range = base['price_range']
+        in_price_range = and_(
+            Product.price >= float(PRICE_BINS[price_range - 1]) if price_range > 0 else true(),
+            Product.price < float(PRICE_BINS[price_range]) if price_range < len(PRICE_BINS) else true()
+        )
+        match_score = (
+            case((_equals(Product.subcategory, base['subcategory']), SUBCATEGORY_WEIGHT), else_=0.0)
+            + case((_equals(Product.brand, base['brand']), BRAND_WEIGHT), else_=0.0)
+            + case((in_price_range, PRICE_RANGE_WEIGHT), else_=0.0)
+        )
+        
+        # (only the columns used for scoring and the response - skips the large text fields)
+        candidates = db.query(Product).options(
+            load_only(*RECOMMENDATION_COLUMNS)
+        ).filter(
             Product.category == base_product.category,
             Product.id != product_id,
             Product.in_stock == True
-        ).all()
+        ).order_by(
+            match_score.desc(),
+            func.abs(func.round(func.coalesce(Product.rating, 0)) - base['rating'])
+        ).limit(limit * 2).all()
+        
+        if not candidates:
+            return []
         
-        # Calculate similarities
-        similarities = []
-        for candidate in candidates:
-            similarity = self.calculate_similarity(base_product, candidate)
-            if similarity >= min_similarity:
-                similarities.append((candidate, similarity))
+        # Score the candidates at once (same formula as calculate_similarity)
+        categories = np.array([c.category for c in candidates], dtype=object)
+        subcategories = np.array([c.subcategory for c in candidates], dtype=object)
+        brands = np.array([c.brand for c in candidates], dtype=object)
+        price_ranges = self._price_bucket(np.array([c.price for c in candidates], dtype=np.float64))
+        ratings = np.rint(np.array([c.rating or 0 for c in candidates], dtype=np.float64))
+        
+        same_category = categories == base['category']
+        scores = (
+            CATEGORY_WEIGHT * same_category
+            + SUBCATEGORY_WEIGHT * (same_category & (subcategories == base['subcategory']))
+            + BRAND_WEIGHT * (brands == base['brand'])
+            + PRICE_RANGE_WEIGHT * (price_ranges == base['price_range'])
+            + RATING_WEIGHT * (1 - np.abs(ratings - base['rating']) / 5)
+        )
         
-        # Sort by similarity score
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        # Top `limit` above the threshold, best first
+        top = np.flatnonzero(scores >= min_similarity)
+        if len(top) > limit:
+            top = top[np.argpartition(-scores[top], limit)[:limit]]
+        top = top[np.argsort(-scores[top])]
         
-        return similarities[:limit]
+        return [(candidates[i], float(scores[i])) for i in top]
     
     def recommend_from_wishlist(
         self,
+        db: Session,
         user_id: int,
-        limit: int = 10
+        limit: int = 10,
+        wishlist_product_ids: Optional[List[int]] = None,
+        min_similarity: float = 0.3
     ) -> List[Tuple[Product, float]]:
         """
-        Recommend products based on user's wishlist
+        Recommend products based on user's wishlist: in-stock products of the
+        wishlist items' categories, scored by feature similarity (full for the
+        first matching wishlist item, half for each further one)
+        (pass wishlist_product_ids if already loaded to skip the query)
         """
         # Get wishlist products
-        wishlist = self.db.query(Wishlist).filter(
-            Wishlist.user_id == user_id
-        ).all()
+        if wishlist_product_ids is None:
+            wishlist_product_ids = [
+                product_id for (product_id,) in db.query(Wishlist.product_id).filter(
+                    Wishlist.user_id == user_id
+                )
+            ]
         
-        if not wishlist:
+        if not wishlist_product_ids:
             return []
         
-        # Get similar products for each wishlist item
-        all_recommendations = {}
-        
-        for item in wishlist:
-            similar = self.get_similar_products(item.product_id, limit=20)
-            for product, score in similar:
-                if product.id in all_recommendations:
-                    # If already recommended, increase score
-                    all_recommendations[product.id] = (
-                        product,
-                        all_recommendations[product.id][1] + score * 0.5
-                    )
-                else:
-                    all_recommendations[product.id] = (product, score)
-        
-        # Sort by aggregate score
-        recommendations = sorted(
-            all_recommendations.values(),
-            key=lambda x: x[1],
-            reverse=True
-        )
+        features = self.get_feature_matrix(db)
+        wishlist_rows = np.array([
+            features.product_rows[product_id]
+            for product_id in wishlist_product_ids
+            if product_id in features.product_rows
+        ], dtype=np.int64)
+        if not len(wishlist_rows):
+            return []
+        
+        # (W, N) similarity of each wishlist item to every product in one sparse product,
+        # keeping the same-category, in-stock matches above the threshold
+        weighted_rows = features.matrix[wishlist_rows] @ diags(features.column_weights)
+        similarities = (weighted_rows @ features.matrix.T).toarray()
+        similarities[np.arange(len(wishlist_rows)), wishlist_rows] = 0.0
+        similarities[features.category_codes[None, :] != features.category_codes[wishlist_rows][:, None]] = 0.0
+        similarities[:, ~features.in_stock] = 0.0
+        similarities[similarities < min_similarity] = 0.0
+        
+        # Each wishlist item contributes only its WISHLIST_MATCHES_PER_ITEM most similar products
+        if similarities.shape[1] > WISHLIST_MATCHES_PER_ITEM:
+            top_columns = np.argpartition(-similarities, WISHLIST_MATCHES_PER_ITEM - 1, axis=1)[:, :WISHLIST_MATCHES_PER_ITEM]
+            kept = np.zeros_like(similarities, dtype=bool)
+            np.put_along_axis(kept, top_columns, True, axis=1)
+            similarities[~kept] = 0.0
+        
+        # The first wishlist item matching a product counts fully, later ones at 0.5:
+        # first + 0.5 * (total - first), without a Python loop over the matches
+        first_match = similarities[(similarities > 0).argmax(axis=0), np.arange(similarities.shape[1])]
+        scores = 0.5 * (similarities.sum(axis=0) + first_match)
         
-        return recommendations[:limit]
+        # Keep the best `limit`
+        top_rows = np.flatnonzero(scores > 0)
+        if len(top_rows) > limit:
+            top_rows = top_rows[np.argpartition(-scores[top_rows], limit)[:limit]]
+        
+        products_by_id = {
+            product.id: product
+            for product in db.query(Product).options(
+                load_only(*RECOMMENDATION_COLUMNS)
+            ).filter(
+                Product.id.in_([int(features.product_ids[row]) for row in top_rows])
+            )
+        }
+        
+        recommendations = [
+            (products_by_id[int(features.product_ids[row])], float(scores[row]))
+            for row in top_rows
+            if int(features.product_ids[row]) in products_by_id
+        ]
+        recommendations.sort(key=lambda x: x[1], reverse=True)
+        
+        return recommendations
 
 
 class CollaborativeFilter:
@@ -159,142 +474,265 @@ class CollaborativeFilter:
     Collaborative Filtering: Recommend based on similar users' preferences
     """
     
-    def __init__(self, db: Session):
-        self.db = db
+    def __init__(self):
+        # Last built matrix, reused until an interaction is added or removed
+        # (or it is MATRIX_MAX_AGE_SECONDS old)
+        self._matrix_cache: Optional[UserProductMatrix] = None
+        self._matrix_token: Optional[Tuple[int, ...]] = None
+        self._matrix_built_at = 0.0  # time.monotonic() of the last build
+        self._matrix_lock = threading.Lock()
     
-    def get_user_product_matrix(self) -> Dict[int, Dict[int, float]]:
-        """
-        Build user-product interaction matrix
-        Returns: {user_id: {product_id: score}}
+    def _matrix_staleness_token(self, db: Session) -> Tuple[int, ...]:
         """
-        matrix = defaultdict(lambda: defaultdict(float))
+        Row count and max(id) of each of the three interaction sources (one round-trip)
         
-        # Wishlist interactions (score: 3.0)
-        wishlists = self.db.query(Wishlist).all()
-        for item in wishlists:
-            matrix[item.user_id][item.product_id] += 3.0
-        
-        # Search history (score: 1.0)
-        searches = self.db.query(SearchHistory).filter(
-            SearchHistory.clicked_product_id.isnot(None)
-        ).all()
-        for search in searches:
-            if search.user_id and search.clicked_product_id:
-                matrix[search.user_id][search.clicked_product_id] += 1.0
-        
-        # Reviews (score: rating * 0.5)
-        reviews = self.db.query(Review).filter(
-            Review.user_id.isnot(None)
-        ).all()
-        for review in reviews:
-            if review.user_id:
-                matrix[review.user_id][review.product_id] += review.rating * 0.5
-        
-        return dict(matrix)
+        max(id) catches a delete plus an insert that leave the count unchanged
+        """
+        sources = (
+            (Wishlist, ()),
+            (SearchHistory, (SearchHistory.user_id.isnot(None), SearchHistory.clicked_product_id.isnot(None))),
+            (Review, (Review.user_id.isnot(None),)),
+        )
+        token = select(*(
+            select(aggregate).select_from(model).where(*conditions).scalar_subquery()
+            for model, conditions in sources
+            for aggregate in (func.count(), func.coalesce(func.max(model.id), 0))
+        ))
+        return tuple(db.execute(token).one())
     
-    def calculate_user_similarity(
-        self,
-        user1_prefs: Dict[int, float],
-        user2_prefs: Dict[int, float]
-    ) -> float:
+    def _build_sparse_matrix(self, db: Session) -> UserProductMatrix:
         """
-        Calculate cosine similarity between two users
+        Build the user-product interaction matrix in one query
+        
+        Scores are computed in SQL (wishlist 3.0, clicked search result 1.0,
+        review rating * 0.5); repeat interactions are summed by the CSR build.
         """
-        # Find common products
-        common_products = set(user1_prefs.keys()) & set(user2_prefs.keys())
+        interactions = union_all(
+            select(Wishlist.user_id, Wishlist.product_id, literal(3.0)),
+            select(SearchHistory.user_id, SearchHistory.clicked_product_id, literal(1.0)).where(
+                SearchHistory.user_id.isnot(None),
+                SearchHistory.clicked_product_id.isnot(None)
+            ),
+            select(Review.user_id, Review.product_id, Review.rating * 0.5).where(
+                Review.user_id.isnot(None)
+            ),
+        )
         
-        if not common_products:
-            return 0.0
+        # Stream the rows (server-side cursor) and keep only compact NumPy batches
+        user_batches, product_batches, score_batches = [], [], []
+        result = db.execute(interactions.execution_options(yield_per=INTERACTION_BATCH_SIZE))
+        for batch in result.partitions():
+            user_batches.append(np.fromiter((row[0] for row in batch), dtype=np.int64, count=len(batch)))
+            product_batches.append(np.fromiter((row[1] for row in batch), dtype=np.int64, count=len(batch)))
+            score_batches.append(np.fromiter((row[2] for row in batch), dtype=np.float64, count=len(batch)))
         
-        # Calculate cosine similarity
-        dot_product = sum(
-            user1_prefs[p] * user2_prefs[p] 
-            for p in common_products
+        user_ids, user_rows = np.unique(
+            np.concatenate(user_batches) if user_batches else np.empty(0, dtype=np.int64),
+            return_inverse=True
+        )
+        product_ids, product_cols = np.unique(
+            np.concatenate(product_batches) if product_batches else np.empty(0, dtype=np.int64),
+            return_inverse=True
         )
+        scores = np.concatenate(score_batches) if score_batches else np.empty(0, dtype=np.float64)
         
-        magnitude1 = math.sqrt(sum(v**2 for v in user1_prefs.values()))
-        magnitude2 = math.sqrt(sum(v**2 for v in user2_prefs.values()))
+        matrix = csr_matrix(
+            (scores, (user_rows, product_cols)),
+            shape=(len(user_ids), len(product_ids))
+        )
+        matrix.sum_duplicates()
         
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0.0
+        # L2-normalize rows once per build instead of once per similarity query
+        norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+        normalized = (diags(1.0 / np.where(norms > 0, norms, 1.0)) @ matrix).tocsr()
         
-        return dot_product / (magnitude1 * magnitude2)
+        return UserProductMatrix(
+            matrix=matrix,
+            normalized=normalized,
+            user_ids=user_ids,
+            product_ids=product_ids,
+            user_rows={int(user_id): row for row, user_id in enumerate(user_ids)},
+            lsh=UserLSHIndex(matrix) if len(user_ids) >= LSH_MIN_USERS else None
+        )
+    
+    def get_user_product_matrix(self, db: Session) -> UserProductMatrix:
+        """
+        Build user-product interaction matrix (cached until an interaction
+        is added or removed, at most MATRIX_MAX_AGE_SECONDS)
+        Returns: sparse users x products matrix with its id <-> index maps
+        """
+        token = self._matrix_staleness_token(db)
+        
+        with self._matrix_lock:
+            if (
+                self._matrix_cache is None
+                or self._matrix_token != token
+                or time.monotonic() - self._matrix_built_at > MATRIX_MAX_AGE_SECONDS
+            ):
+                self._matrix_cache = self._build_sparse_matrix(db)
+                self._matrix_token = token
+                self._matrix_built_at = time.monotonic()
+            return self._matrix_cache
     
     def find_similar_users(
         self,
+        db: Session,
         user_id: int,
         limit: int = 10,
-        min_similarity: float = 0.1
+        min_similarity: float = 0.1,
+        interactions: Optional[UserProductMatrix] = None
     ) -> List[Tuple[int, float]]:
         """
         Find users with similar preferences
         Returns list of (user_id, similarity_score) tuples
         """
-        matrix = self.get_user_product_matrix()
+        if interactions is None:
+            interactions = self.get_user_product_matrix(db)
         
-        if user_id not in matrix:
+        row = interactions.user_rows.get(user_id)
+        if row is None:
             return []
         
-        user_prefs = matrix[user_id]
-        similarities = []
+        # Exact cosine against every user, or only the LSH bucket-mates on large user bases
+        if interactions.lsh is not None:
+            candidate_rows = interactions.lsh.candidates(interactions.matrix[row])
+            compared = interactions.normalized[candidate_rows]
+        else:
+            candidate_rows = np.arange(interactions.matrix.shape[0])
+            compared = interactions.normalized
         
-        for other_user_id, other_prefs in matrix.items():
-            if other_user_id == user_id:
-                continue
-            
-            similarity = self.calculate_user_similarity(user_prefs, other_prefs)
-            if similarity >= min_similarity:
-                similarities.append((other_user_id, similarity))
+        similarities = (compared @ interactions.normalized[row].T).toarray().ravel()
+        similarities[candidate_rows == row] = 0.0
         
-        # Sort by similarity
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        # Select the top `limit` above the threshold without sorting every user
+        candidates = np.flatnonzero(similarities >= min_similarity)
+        if len(candidates) > limit:
+            top = np.argpartition(-similarities[candidates], limit)[:limit]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-similarities[candidates])]
         
-        return similarities[:limit]
+        return [
+            (int(interactions.user_ids[candidate_rows[i]]), float(similarities[i]))
+            for i in candidates
+        ]
     
     def recommend_from_similar_users(
         self,
+        db: Session,
         user_id: int,
         limit: int = 10
     ) -> List[Tuple[Product, float]]:
         """
         Recommend products based on similar users' preferences
         """
-        matrix = self.get_user_product_matrix()
+        interactions = self.get_user_product_matrix(db)
         
         # Find similar users
-        similar_users = self.find_similar_users(user_id, limit=20)
+        similar_users = self.find_similar_users(db, user_id, limit=20, interactions=interactions)
         
         if not similar_users:
             return []
         
-        # Get current user's products
-        user_products = set(matrix.get(user_id, {}).keys())
+        # Similarity-weighted sum of the similar users' rows
+        similar_rows = [interactions.user_rows[other_id] for other_id, _ in similar_users]
+        weights = np.array([similarity for _, similarity in similar_users])
+        scores = interactions.matrix[similar_rows].T @ weights
         
-        # Aggregate recommendations from similar users
-        recommendations = defaultdict(float)
+        # Don't recommend products user already interacted with
+        user_row = interactions.user_rows[user_id]
+        scores[interactions.matrix[user_row].indices] = 0.0
         
-        for similar_user_id, similarity in similar_users:
-            similar_user_prefs = matrix.get(similar_user_id, {})
-            
-            for product_id, score in similar_user_prefs.items():
-                # Don't recommend products user already interacted with
-                if product_id not in user_products:
-                    recommendations[product_id] += score * similarity
+        # Only the best candidates are fetched (3x headroom for out-of-stock ones)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit * 3:
+            candidates = candidates[np.argpartition(-scores[candidates], limit * 3)[:limit * 3]]
         
-        # Get product objects and sort
-        result = []
-        for product_id, score in recommendations.items():
-            product = self.db.query(Product).filter(
-                Product.id == product_id,
-                Product.in_stock == True
-            ).first()
-            
-            if product:
-                result.append((product, score))
+        recommendations = {
+            int(interactions.product_ids[col]): float(scores[col])
+            for col in candidates
+        }
+        
+        # Get product objects in one query and sort
+        products = db.query(Product).options(
+            load_only(*RECOMMENDATION_COLUMNS)
+        ).filter(
+            Product.id.in_(recommendations.keys()),
+            Product.in_stock == True
+        ).all()
+        
+        result = [(product, recommendations[product.id]) for product in products]
         
         result.sort(key=lambda x: x[1], reverse=True)
         
         return result[:limit]
+    
+    def recommend_from_similar_users_batch(
+        self,
+        db: Session,
+        user_ids: List[int],
+        limit: int = 10,
+        neighbors: int = 20,
+        min_similarity: float = 0.1
+    ) -> Dict[int, List[Tuple[Product, float]]]:
+        """
+        recommend_from_similar_users for many users at once (evaluation,
+        precompute jobs): one similarity block, one sparse product for all
+        scores and one product query instead of a round per user
+        Returns: {user_id: [(product, score), ...]} (empty list for unknown users)
+        """
+        results: Dict[int, List[Tuple[Product, float]]] = {user_id: [] for user_id in user_ids}
+        
+        interactions = self.get_user_product_matrix(db)
+        known_users = [user_id for user_id in results if user_id in interactions.user_rows]
+        if not known_users:
+            return results
+        
+        rows = np.array([interactions.user_rows[user_id] for user_id in known_users])
+        user_matrix = interactions.matrix[rows]
+        
+        # (B, U) similarities, keeping each user's `neighbors` nearest like the single-user path
+        similarities = (interactions.normalized[rows] @ interactions.normalized.T).toarray()
+        similarities[np.arange(len(rows)), rows] = 0.0
+        similarities[similarities < min_similarity] = 0.0
+        if similarities.shape[1] > neighbors:
+            cutoff = np.partition(similarities, -neighbors, axis=1)[:, -neighbors]
+            similarities[similarities < cutoff[:, None]] = 0.0
+        
+        # (B, P) scores in one sparse product, minus already-interacted products
+        scores = (csr_matrix(similarities) @ interactions.matrix).toarray()
+        scores[(user_matrix > 0).toarray()] = 0.0
+        
+        top_cols = {}
+        for i, user_id in enumerate(known_users):
+            candidates = np.flatnonzero(scores[i] > 0)
+            if len(candidates) > limit * 3:
+                candidates = candidates[np.argpartition(-scores[i, candidates], limit * 3)[:limit * 3]]
+            top_cols[user_id] = candidates
+        
+        product_ids = {
+            int(interactions.product_ids[col])
+            for candidates in top_cols.values() for col in candidates
+        }
+        products_by_id = {
+            product.id: product
+            for product in db.query(Product).options(
+                load_only(*RECOMMENDATION_COLUMNS)
+            ).filter(
+                Product.id.in_(product_ids),
+                Product.in_stock == True
+            )
+        }
+        
+        for i, user_id in enumerate(known_users):
+            recommended = []
+            for col in top_cols[user_id]:
+                product = products_by_id.get(int(interactions.product_ids[col]))
+                if product:
+                    recommended.append((product, float(scores[i, col])))
+            recommended.sort(key=lambda x: x[1], reverse=True)
+            results[user_id] = recommended[:limit]
+        
+        return results
 
 
 class HybridRecommendationEngine:
@@ -302,21 +740,61 @@ class HybridRecommendationEngine:
     Hybrid recommendation system combining multiple strategies with agent memory
     """
     
-    def __init__(self, db: Session):
-        self.db = db
-        self.content_filter = ContentBasedFilter(db)
-        self.collab_filter = CollaborativeFilter(db)
+    def __init__(self):
+        self.content_filter = ContentBasedFilter()
+        self.collab_filter = CollaborativeFilter()
     
-    def get_agent_memory_context(self, user_id: int) -> Dict:
+    def _get_recent_conversations(self, db: Session, user_id: int, limit: int) -> List[ConversationHistory]:
         """
-        Extract context from conversation history for personalized recommendations
+        Most recent conversations of a user, newest first
+        (only the columns the memory context reads - agent_response and
+        context_data are large and never used here)
         """
-        # Get recent conversations
-        recent_convs = self.db.query(ConversationHistory).filter(
+        return db.query(ConversationHistory).options(
+            load_only(
+                ConversationHistory.id,
+                ConversationHistory.user_message,
+                ConversationHistory.intent,
+                ConversationHistory.products_mentioned
+            )
+        ).filter(
             ConversationHistory.user_id == user_id
         ).order_by(
             desc(ConversationHistory.created_at)
-        ).limit(10).all()
+        ).limit(limit).all()
+    
+    def build_user_context(self, db: Session, user_id: int) -> UserContext:
+        """
+        Load everything the recommenders need about a user in two queries
+        (recent conversations + wishlist), for endpoints that call several
+        engine methods for the same user
+        """
+        recent_convs = self._get_recent_conversations(db, user_id, limit=20)
+        wishlist_product_ids = [
+            product_id for (product_id,) in db.query(Wishlist.product_id).filter(
+                Wishlist.user_id == user_id
+            )
+        ]
+        
+        return UserContext(
+            user_id=user_id,
+            wishlist_product_ids=wishlist_product_ids,
+            memory_context=self.get_agent_memory_context(db, user_id, recent_convs[:10]),
+            recent_messages=[conv.user_message.lower() for conv in recent_convs]
+        )
+    
+    def get_agent_memory_context(
+        self,
+        db: Session,
+        user_id: int,
+        recent_convs: Optional[List[ConversationHistory]] = None
+    ) -> Dict:
+        """
+        Extract context from conversation history for personalized recommendations
+        """
+        # Get recent conversations
+        if recent_convs is None:
+            recent_convs = self._get_recent_conversations(db, user_id, limit=10)
         
         context = {
             'recent_intents': [],
@@ -332,15 +810,13 @@ class HybridRecommendationEngine:
             
             if conv.products_mentioned:
                 try:
-                    products = json.loads(conv.products_mentioned)
-                    context['mentioned_products'].extend(products)
-                except:
+                    context['mentioned_products'].extend(orjson.loads(conv.products_mentioned))
+                except (orjson.JSONDecodeError, TypeError):
                     pass
             
-            # Extract categories from messages
+            # Extract categories from messages (substring match, so "smartphones" counts as phone)
             message = conv.user_message.lower()
-            categories = ['laptop', 'phone', 'headphone', 'camera', 'watch']
-            for cat in categories:
+            for cat in MEMORY_CATEGORIES:
                 if cat in message and cat not in context['mentioned_categories']:
                     context['mentioned_categories'].append(cat)
         
@@ -348,41 +824,63 @@ class HybridRecommendationEngine:
     
     def get_personalized_recommendations(
         self,
+        db: Session,
         user_id: int,
         limit: int = 20,
-        strategy: str = 'hybrid'
+        strategy: str = 'hybrid',
+        user_ctx: Optional[UserContext] = None
     ) -> List[Dict]:
         """
         Get personalized recommendations using hybrid approach
         
         strategy: 'content', 'collaborative', or 'hybrid'
+        user_ctx: preloaded context from build_user_context (optional)
         """
-        recommendations = defaultdict(float)
+        recommendations: Dict[int, Tuple[Product, float]] = {}
+        
+        def add(product: Product, score: float):
+            if product.id in recommendations:
+                product, current = recommendations[product.id]
+                recommendations[product.id] = (product, current + score * 0.5)
+            else:
+                recommendations[product.id] = (product, score * 0.5)
         
         # Get agent memory context
-        memory_context = self.get_agent_memory_context(user_id)
+        if user_ctx is not None:
+            memory_context = user_ctx.memory_context
+        else:
+            memory_context = self.get_agent_memory_context(db, user_id)
         
         if strategy in ['content', 'hybrid']:
             # Content-based from wishlist
-            content_recs = self.content_filter.recommend_from_wishlist(user_id, limit=30)
+            content_recs = self.content_filter.recommend_from_wishlist(
+                db,
+                user_id,
+                limit=30,
+                wishlist_product_ids=user_ctx.wishlist_product_ids if user_ctx else None
+            )
             for product, score in content_recs:
-                recommendations[product.id] = (product, recommendations.get(product.id, (product, 0))[1] + score * 0.5)
+                add(product, score)
         
         if strategy in ['collaborative', 'hybrid']:
             # Collaborative filtering
-            collab_recs = self.collab_filter.recommend_from_similar_users(user_id, limit=30)
+            collab_recs = self.collab_filter.recommend_from_similar_users(db, user_id, limit=30)
             for product, score in collab_recs:
-                recommendations[product.id] = (product, recommendations.get(product.id, (product, 0))[1] + score * 0.5)
+                add(product, score)
         
-        # Apply memory-based boosting
-        for product_id, (product, score) in list(recommendations.items()):
+        # Apply memory-based boosting (both boosts stack)
+        mentioned_categories = {c.lower() for c in memory_context['mentioned_categories']}
+        mentioned_products = set(memory_context['mentioned_products'])
+        for product_id, (product, score) in recommendations.items():
             # Boost if category mentioned in recent conversations
-            if product.category and product.category.lower() in [c.lower() for c in memory_context['mentioned_categories']]:
-                recommendations[product_id] = (product, score * 1.3)
+            if product.category and product.category.lower() in mentioned_categories:
+                score *= 1.3
             
             # Boost if similar to mentioned products
-            if product_id in memory_context['mentioned_products']:
-                recommendations[product_id] = (product, score * 1.2)
+            if product_id in mentioned_products:
+                score *= 1.2
+            
+            recommendations[product_id] = (product, score)
         
         # Sort by score
         sorted_recs = sorted(
@@ -408,63 +906,103 @@ class HybridRecommendationEngine:
         
         return result
     
-    def get_trending_products(self, limit: int = 10) -> List[Dict]:
+    def get_trending_products(self, db: Session, limit: int = 10) -> List[Dict]:
         """
         Get trending products based on recent interactions
         """
         # Products from recent searches (last 7 days)
         week_ago = datetime.utcnow() - timedelta(days=7)
         
-        trending_searches = self.db.query(
-            SearchHistory.clicked_product_id,
+        # Products joined to their click counts in one round-trip
+        # (GROUP BY the primary key lets Postgres select the other product columns)
+        trending = db.query(
+            Product,
             func.count(SearchHistory.id).label('count')
+        ).options(
+            load_only(*RECOMMENDATION_COLUMNS)
+        ).join(
+            SearchHistory, SearchHistory.clicked_product_id == Product.id
         ).filter(
-            SearchHistory.clicked_product_id.isnot(None),
-            SearchHistory.search_timestamp >= week_ago
+            SearchHistory.search_timestamp >= week_ago,
+            Product.in_stock == True
         ).group_by(
-            SearchHistory.clicked_product_id
+            Product.id
         ).order_by(
             desc('count')
         ).limit(limit).all()
         
         result = []
-        for product_id, count in trending_searches:
-            product = self.db.query(Product).filter(Product.id == product_id).first()
-            if product:
-                result.append({
-                    'product_id': product.id,
-                    'name': product.name,
-                    'brand': product.brand,
-                    'category': product.category,
-                    'price': float(product.price),
-                    'rating': float(product.rating) if product.rating else 0.0,
-                    'image_url': product.image_url,
-                    'trend_score': int(count),
-                    'in_stock': product.in_stock
-                })
+        for product, count in trending:
+            result.append({
+                'product_id': product.id,
+                'name': product.name,
+                'brand': product.brand,
+                'category': product.category,
+                'price': float(product.price),
+                'rating': float(product.rating) if product.rating else 0.0,
+                'image_url': product.image_url,
+                'trend_score': int(count),
+                'in_stock': product.in_stock
+            })
         
         return result
     
+    @staticmethod
+    def _find_mentioned_brands(brands: Set[str], text: str) -> Set[str]:
+        """Which of the (lowercased) brands occur as substrings of `text`"""
+        brands.discard('')
+        if not brands or not text:
+            return set()
+        
+        if ahocorasick is None:
+            return {brand for brand in brands if brand in text}
+        
+        # Aho-Corasick: all brands matched in a single scan of the text
+        automaton = ahocorasick.Automaton()
+        for brand in brands:
+            automaton.add_word(brand, brand)
+        automaton.make_automaton()
+        return {brand for _, brand in automaton.iter(text)}
+    
     def get_category_recommendations(
         self,
+        db: Session,
         user_id: int,
         category: str,
-        limit: int = 10
+        limit: int = 10,
+        user_ctx: Optional[UserContext] = None
     ) -> List[Dict]:
         """
         Get recommendations within a specific category
+        
+        user_ctx: preloaded context from build_user_context (optional)
         """
-        # Get user's interaction history
-        memory_context = self.get_agent_memory_context(user_id)
+        # Get user's recent messages (once, not per product)
+        if user_ctx is not None:
+            recent_messages = user_ctx.recent_messages
+        else:
+            recent_messages = [
+                conv.user_message.lower()
+                for conv in self._get_recent_conversations(db, user_id, limit=20)
+            ]
         
         # Get products in category
-        products = self.db.query(Product).filter(
+        products = db.query(Product).options(
+            load_only(*RECOMMENDATION_COLUMNS)
+        ).filter(
             Product.category == category,
             Product.in_stock == True
         ).order_by(
             desc(Product.rating)
         ).limit(50).all()
         
+        # Brands mentioned in recent conversations, found in one pass over the text
+        # (newline-joined so a match cannot span two messages)
+        mentioned_brands = self._find_mentioned_brands(
+            {product.brand.lower() for product in products if product.brand},
+            "\n".join(recent_messages)
+        )
+        
         # Score based on rating and user preferences
         scored_products = []
         for product in products:
@@ -472,12 +1010,7 @@ class HybridRecommendationEngine:
             
             # Boost if brand mentioned in conversations
             # (Simplified - in production, use NLP)
-            if product.brand and any(
-                product.brand.lower() in conv.user_message.lower()
-                for conv in self.db.query(ConversationHistory).filter(
-                    ConversationHistory.user_id == user_id
-                ).limit(20).all()
-            ):
+            if product.brand and product.brand.lower() in mentioned_brands:
                 score *= 1.2
             
             scored_products.append((product, score))
@@ -499,3 +1032,7 @@ class HybridRecommendationEngine:
             })
         
         return result
+
+
+# Global instance for easy importing (stateless - each call takes the request's Session)
+recommendation_engine = HybridRecommendationEngine()
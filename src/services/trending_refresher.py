@@ -0,0 +1,74 @@
+# src/services/trending_refresher.py
+"""
+Background refresh of trending products
+
+Trending is the same for every user and only changes as interactions come
+in, so it is computed every TRENDING_REFRESH_SECONDS by a background task
+(started in main.py) instead of on every request. Routes read the
+precomputed list with get_trending(), which recomputes it itself (once,
+however many requests are waiting) only before the first refresh or if the
+list is older than TRENDING_MAX_AGE_SECONDS.
+"""
+
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import time
+
+from src.database.connection import SessionLocal
+from src.services.recommendation_engine import recommendation_engine
+
+logger = logging.getLogger(__name__)
+
+TRENDING_REFRESH_SECONDS = 60
+
+# Serve the precomputed list for at most this long if the background refresh stalls
+TRENDING_MAX_AGE_SECONDS = 300
+
+# Largest limit the trending endpoints accept
+TRENDING_MAX_PRODUCTS = 50
+
+# Latest precomputed list (per worker), best first
+_trending: List[Dict] = []
+_refreshed_at: Optional[float] = None  # time.monotonic() of the last refresh
+_refresh_lock = asyncio.Lock()
+
+
+def _compute_trending() -> List[Dict]:
+    """Compute trending products with a dedicated session"""
+    db = SessionLocal()
+    try:
+        return recommendation_engine.get_trending_products(db, limit=TRENDING_MAX_PRODUCTS)
+    finally:
+        db.close()
+
+
+async def refresh_trending():
+    """Recompute the trending list (sync query runs in a worker thread)"""
+    global _trending, _refreshed_at
+    _trending = await asyncio.to_thread(_compute_trending)
+    _refreshed_at = time.monotonic()
+
+
+def _is_stale() -> bool:
+    return _refreshed_at is None or time.monotonic() - _refreshed_at > TRENDING_MAX_AGE_SECONDS
+
+
+async def refresh_loop():
+    """Background task: keep the trending list fresh"""
+    while True:
+        try:
+            await refresh_trending()
+        except Exception as e:
+            logger.warning(f"Trending refresh failed: {e}")
+        await asyncio.sleep(TRENDING_REFRESH_SECONDS)
+
+
+async def get_trending(limit: int) -> List[Dict]:
+    """Top `limit` trending products (computed on demand until the first refresh lands)"""
+    if _is_stale():
+        async with _refresh_lock:
+            # Another request may have refreshed while this one waited
+            if _is_stale():
+                await refresh_trending()
+    return _trending[:limit]
@@ -0,0 +1,62 @@
+# src/services/wishlist_stats.py
+"""
+Denormalized wishlist category counts
+
+Counts are adjusted in the same transaction as wishlist adds/removes, so
+the stats endpoint reads them directly instead of scanning wishlist+products.
+rebuild_category_counts() recomputes everything from the wishlist table
+(run nightly via scripts/rebuild_wishlist_category_counts.py to fix drift).
+"""
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from src.database.models import Product, Wishlist, WishlistCategoryCount
+
+
+def adjust_category_count(db: Session, user_id: int, category: str, delta: int):
+    """Add delta to a user's wishlist count for a category (caller commits)"""
+    if not category:
+        return
+    
+    stmt = pg_insert(WishlistCategoryCount).values(
+        user_id=user_id,
+        category=category,
+        count=delta
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[WishlistCategoryCount.user_id, WishlistCategoryCount.category],
+        set_={'count': WishlistCategoryCount.count + delta}
+    ))
+    
+    if delta < 0:
+        db.execute(delete(WishlistCategoryCount).where(
+            WishlistCategoryCount.user_id == user_id,
+            WishlistCategoryCount.category == category,
+            WishlistCategoryCount.count <= 0
+        ))
+
+
+def rebuild_category_counts(db: Session) -> int:
+    """Recompute all counts from the wishlist table. Returns rows written."""
+    db.execute(delete(WishlistCategoryCount))
+    
+    result = db.execute(insert(WishlistCategoryCount).from_select(
+        ['user_id', 'category', 'count'],
+        select(
+            Wishlist.user_id,
+            Product.category,
+            func.count(Wishlist.id)
+        ).join(
+            Product, Product.id == Wishlist.product_id
+        ).where(
+            Product.category.isnot(None)
+        ).group_by(
+            Wishlist.user_id,
+            Product.category
+        )
+    ))
+    db.commit()
+    
+    return result.rowcount
@@ -3,20 +3,126 @@ Buy Plan Tools - Fetching card offers and EMI calculations
 Tools for the Buy Plan Optimizer Agent
 """
 
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Literal, Optional, Sequence, Tuple
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
 from datetime import datetime, timedelta
+from functools import lru_cache
 import logging
+import math
+import numpy as np
+import orjson
 
 from src.database.models import Product, CardOffer
+from src.utils.cache import payment_cache
+
+try:
+    from numba import njit
+except ImportError:  # Optional - EMI plans fall back to NumPy array math
+    njit = None
 
 logger = logging.getLogger(__name__)
 
+# Standard annual interest rates (%) for regular EMI by tenure; other tenures use the default
+EMI_INTEREST_RATES = {
+    3: 12.0,
+    6: 13.0,
+    9: 14.0,
+    12: 15.0,
+    18: 16.0,
+    24: 17.0
+}
+DEFAULT_EMI_INTEREST_RATE = 15.0
+DEFAULT_EMI_TENURES = (3, 6, 9, 12, 18, 24)
+DEFAULT_NO_COST_EMI_TENURES = (3, 6, 9, 12)
+
+# Default tenures and their annual/monthly rates as arrays (computed once)
+_TENURE_ARR = np.array(DEFAULT_EMI_TENURES, dtype=np.float64)
+_ANNUAL_RATE_ARR = np.array([EMI_INTEREST_RATES[m] for m in DEFAULT_EMI_TENURES], dtype=np.float64)
+_MONTHLY_RATE_ARR = _ANNUAL_RATE_ARR / 1200.0
+
+# Annual/monthly rate indexed by tenure in months (for arbitrary tenure lists)
+_RATE_BY_MONTH = np.full(max(EMI_INTEREST_RATES) + 1, DEFAULT_EMI_INTEREST_RATE)
+_RATE_BY_MONTH[list(EMI_INTEREST_RATES)] = list(EMI_INTEREST_RATES.values())
+_MONTHLY_RATE_BY_MONTH = _RATE_BY_MONTH / 1200.0
+_DEFAULT_MONTHLY_RATE = DEFAULT_EMI_INTEREST_RATE / 1200.0
+
+EMI_PROCESSING_FEE = 199.0  # Standard processing fee
+
+# Per-plan fields that don't depend on price/tenure; each plan starts as a copy
+_REGULAR_EMI_TEMPLATE = {
+    "tenure_months": 0,
+    "emi_per_month": 0.0,
+    "total_amount": 0.0,
+    "total_interest": 0.0,
+    "interest_rate_annual": 0.0,
+    "processing_fee": EMI_PROCESSING_FEE,
+    "plan_type": "regular_emi"
+}
+_NO_COST_EMI_TEMPLATE = {
+    **_REGULAR_EMI_TEMPLATE,
+    "plan_type": "no_cost_emi",
+    "total_payable": 0.0
+}
+
+
+def _emi_math(price, months, monthly_rates, out_emi, out_total):
+    """
+    Fill EMI and total payable per tenure: P * r * (1+r)^n / ((1+r)^n - 1),
+    with (1+r)^n - 1 as expm1(n * log1p(r)) (no cancellation for small r)
+    """
+    for i in range(months.shape[0]):
+        log_growth = months[i] * math.log1p(monthly_rates[i])
+        out_emi[i] = price * monthly_rates[i] * math.exp(log_growth) / math.expm1(log_growth)
+        out_total[i] = out_emi[i] * months[i]
+
+
+if njit is not None:
+    # Explicit signature: compiled (or loaded from the on-disk cache) at import, not on first call
+    _emi_kernel = njit('void(f8, f8[:], f8[:], f8[:], f8[:])', cache=True, fastmath=True)(_emi_math)
+else:
+    _emi_kernel = None
+
+
+# CardOffer columns read by _format_offer
+_OFFER_COLUMNS = (
+    CardOffer.id,
+    CardOffer.bank_name,
+    CardOffer.offer_type,
+    CardOffer.discount_percentage,
+    CardOffer.discount_amount,
+    CardOffer.cashback_amount,
+    CardOffer.emi_tenure_months,
+    CardOffer.min_transaction_amount,
+    CardOffer.valid_from,
+    CardOffer.valid_till,
+    CardOffer.offer_description,
+)
+
+
+def _format_offer(offer) -> Dict[str, Any]:
+    """Offer dict from a CardOffer or an _OFFER_COLUMNS row (Float columns already load as float)"""
+    return {
+        "id": offer.id,
+        "bank_name": offer.bank_name,
+        "offer_type": offer.offer_type,  # instant_discount, cashback, no_cost_emi
+        "discount_percent": offer.discount_percentage or None,
+        "discount_amount": offer.discount_amount or None,
+        "cashback_amount": offer.cashback_amount or None,
+        "emi_months": offer.emi_tenure_months,
+        "emi_amount": None,  # Will be calculated if needed
+        "min_purchase": offer.min_transaction_amount or None,
+        "max_discount": None,  # Not in current model
+        "valid_from": offer.valid_from.isoformat() if offer.valid_from else None,
+        "valid_till": offer.valid_till.isoformat() if offer.valid_till else None,
+        "terms": offer.offer_description
+    }
+
 
 async def get_card_offers(
     db: Session,
-    product_id: int
+    product_id: int,
+    product: Optional[Product] = None
 ) -> List[Dict[str, Any]]:
     """
     Fetch all active card offers for a product
@@ -24,48 +130,34 @@ async def get_card_offers(
     Args:
         db: Database session
         product_id: Product ID
+        product: Product already loaded with its card_offers (skips the query)
         
     Returns:
         List of active card offers
     """
     try:
-        # Get product
-        product = db.query(Product).filter(Product.id == product_id).first()
-        
-        if not product:
-            logger.warning(f"Product {product_id} not found")
-            return []
-        
-        # Get all card offers for this product
-        offers = db.query(CardOffer).filter(
-            CardOffer.product_id == product_id
-        ).all()
+        # Cached as orjson bytes, so every caller gets its own copy to modify
+        cached_offers = payment_cache.get(f"card_offers:{product_id}")
+        if cached_offers is not None:
+            return orjson.loads(cached_offers)
+        
+        if product is not None:
+            offers = product.card_offers
+        else:
+            # Plain column tuples - no ORM object hydration
+            offers = db.query(*_OFFER_COLUMNS).filter(
+                CardOffer.product_id == product_id
+            ).all()
         
         if not offers:
             logger.info(f"No card offers found for product {product_id}")
+            payment_cache.set(f"card_offers:{product_id}", orjson.dumps([]))
             return []
         
-        # Format offers
-        formatted_offers = []
-        for offer in offers:
-            offer_data = {
-                "id": offer.id,
-                "bank_name": offer.bank_name,
-                "offer_type": offer.offer_type,  # instant_discount, cashback, no_cost_emi
-                "discount_percent": float(offer.discount_percentage) if offer.discount_percentage else None,
-                "discount_amount": float(offer.discount_amount) if offer.discount_amount else None,
-                "cashback_amount": float(offer.cashback_amount) if offer.cashback_amount else None,
-                "emi_months": int(offer.emi_tenure) if offer.emi_tenure and offer.emi_tenure.isdigit() else None,
-                "emi_amount": None,  # Will be calculated if needed
-                "min_purchase": float(offer.min_transaction_amount) if offer.min_transaction_amount else None,
-                "max_discount": None,  # Not in current model
-                "valid_from": offer.valid_from.isoformat() if offer.valid_from else None,
-                "valid_till": offer.valid_till.isoformat() if offer.valid_till else None,
-                "terms": offer.offer_description
-            }
-            formatted_offers.append(offer_data)
+        formatted_offers = [_format_offer(offer) for offer in offers]
         
         logger.info(f"Found {len(formatted_offers)} card offers for product {product_id}")
+        payment_cache.set(f"card_offers:{product_id}", orjson.dumps(formatted_offers))
         return formatted_offers
         
     except Exception as e:
@@ -73,9 +165,55 @@ async def get_card_offers(
         return []
 
 
-async def calculate_emi_plans(
+@lru_cache(maxsize=512)
+def _regular_emi_plans(price_cents: int, tenures: Tuple[int, ...]) -> Tuple[Dict[str, Any], ...]:
+    """Regular EMI plans for a price in integer cents (memoized - rates are constants)"""
+    price = price_cents / 100
+    
+    # Annual and monthly rate per tenure (table lookups - no per-call division)
+    if tenures == DEFAULT_EMI_TENURES:
+        months, annual_rates, monthly_rates = _TENURE_ARR, _ANNUAL_RATE_ARR, _MONTHLY_RATE_ARR
+    else:
+        tenure_index = np.array(tenures, dtype=np.int64)
+        in_table = (tenure_index >= 0) & (tenure_index < len(_RATE_BY_MONTH))
+        table_index = np.clip(tenure_index, 0, len(_RATE_BY_MONTH) - 1)
+        months = tenure_index.astype(np.float64)
+        annual_rates = np.where(in_table, _RATE_BY_MONTH[table_index], DEFAULT_EMI_INTEREST_RATE)
+        monthly_rates = np.where(in_table, _MONTHLY_RATE_BY_MONTH[table_index], _DEFAULT_MONTHLY_RATE)
+    
+    # EMI formula for all tenures at once: P * r * (1+r)^n / ((1+r)^n - 1)
+    if _emi_kernel is not None:
+        emi_amounts = np.empty(len(months))
+        total_amounts = np.empty(len(months))
+        _emi_kernel(price, months, monthly_rates, emi_amounts, total_amounts)
+    else:
+        log_growth = months * np.log1p(monthly_rates)
+        emi_amounts = price * monthly_rates * np.exp(log_growth) / np.expm1(log_growth)
+        total_amounts = emi_amounts * months
+    
+    # Round to paise for all tenures at once (rint of the amount in cents),
+    # then hand plain Python floats to the dicts
+    emi_amounts = (np.rint(emi_amounts * 100) / 100).tolist()
+    interest = (np.rint((total_amounts - price) * 100) / 100).tolist()
+    total_amounts = (np.rint(total_amounts * 100) / 100).tolist()
+    
+    plans = []
+    for m, rate, emi, total, total_interest in zip(
+        months.tolist(), annual_rates.tolist(), emi_amounts, total_amounts, interest
+    ):
+        plan = _REGULAR_EMI_TEMPLATE.copy()
+        plan["tenure_months"] = int(m)
+        plan["emi_per_month"] = emi
+        plan["total_amount"] = total
+        plan["total_interest"] = total_interest
+        plan["interest_rate_annual"] = rate
+        plans.append(plan)
+    return tuple(plans)
+
+
+def calculate_emi_plans(
     price: float,
-    tenures: List[int] = [3, 6, 9, 12, 18, 24]
+    tenures: Sequence[int] = DEFAULT_EMI_TENURES
 ) -> List[Dict[str, Any]]:
     """
     Calculate EMI plans for different tenures
@@ -88,53 +226,34 @@ async def calculate_emi_plans(
         List of EMI plans with calculations
     """
     try:
-        emi_plans = []
-        
-        # Standard interest rates for regular EMI
-        interest_rates = {
-            3: 12.0,   # 12% annual for 3 months
-            6: 13.0,   # 13% annual for 6 months
-            9: 14.0,   # 14% annual for 9 months
-            12: 15.0,  # 15% annual for 12 months
-            18: 16.0,  # 16% annual for 18 months
-            24: 17.0   # 17% annual for 24 months
-        }
-        
-        for months in tenures:
-            # Get interest rate for this tenure
-            annual_rate = interest_rates.get(months, 15.0)
-            monthly_rate = annual_rate / 12 / 100
-            
-            # Calculate EMI using formula: P * r * (1+r)^n / ((1+r)^n - 1)
-            if monthly_rate > 0:
-                emi_amount = (price * monthly_rate * ((1 + monthly_rate) ** months)) / \
-                             (((1 + monthly_rate) ** months) - 1)
-            else:
-                emi_amount = price / months
-            
-            total_amount = emi_amount * months
-            total_interest = total_amount - price
-            
-            emi_plans.append({
-                "tenure_months": months,
-                "emi_per_month": round(emi_amount, 2),
-                "total_amount": round(total_amount, 2),
-                "total_interest": round(total_interest, 2),
-                "interest_rate_annual": annual_rate,
-                "processing_fee": 199.0,  # Standard processing fee
-                "plan_type": "regular_emi"
-            })
-        
-        return emi_plans
+        # Copies, so callers can't modify the memoized plans
+        return [dict(plan) for plan in _regular_emi_plans(round(price * 100), tuple(tenures))]
         
     except Exception as e:
         logger.error(f"Error calculating EMI plans: {str(e)}")
         return []
 
 
-async def calculate_no_cost_emi(
+@lru_cache(maxsize=512)
+def _no_cost_emi_plans(price_cents: int, tenures: Tuple[int, ...]) -> Tuple[Dict[str, Any], ...]:
+    """No Cost EMI plans for a price in integer cents (memoized)"""
+    price = price_cents / 100
+    
+    plans = []
+    for months in tenures:
+        plan = _NO_COST_EMI_TEMPLATE.copy()
+        plan["tenure_months"] = months
+        # No cost EMI: Total = Price (no interest)
+        plan["emi_per_month"] = round(price / months, 2)
+        plan["total_amount"] = round(price, 2)
+        plan["total_payable"] = round(price + EMI_PROCESSING_FEE, 2)
+        plans.append(plan)
+    return tuple(plans)
+
+
+def calculate_no_cost_emi(
     price: float,
-    tenures: List[int] = [3, 6, 9, 12]
+    tenures: Sequence[int] = DEFAULT_NO_COST_EMI_TENURES
 ) -> List[Dict[str, Any]]:
     """
     Calculate No Cost EMI plans (interest absorbed by merchant)
@@ -147,36 +266,103 @@ async def calculate_no_cost_emi(
         List of No Cost EMI plans
     """
     try:
-        no_cost_plans = []
-        
-        for months in tenures:
-            # No cost EMI: Total = Price (no interest)
-            emi_amount = price / months
-            processing_fee = 199.0
-            
-            no_cost_plans.append({
-                "tenure_months": months,
-                "emi_per_month": round(emi_amount, 2),
-                "total_amount": round(price, 2),
-                "total_interest": 0.0,
-                "interest_rate_annual": 0.0,
-                "processing_fee": processing_fee,
-                "plan_type": "no_cost_emi",
-                "total_payable": round(price + processing_fee, 2)
-            })
-        
-        return no_cost_plans
+        return [dict(plan) for plan in _no_cost_emi_plans(round(price * 100), tuple(tenures))]
         
     except Exception as e:
         logger.error(f"Error calculating no-cost EMI: {str(e)}")
         return []
 
 
-async def calculate_total_savings(
+def _instant_discount_savings(product_price: float, offers: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Savings of each offer as an instant discount: the flat discount amount if
+    set, else the percentage of the price (capped at max_discount if set), else 0
+    """
+    def column(key: str, missing: float) -> np.ndarray:
+        return np.fromiter((offer[key] or missing for offer in offers), dtype=np.float64, count=len(offers))
+    
+    amounts = column('discount_amount', np.nan)
+    percents = column('discount_percent', np.nan)
+    caps = column('max_discount', np.inf)
+    
+    percent_savings = np.where(np.isnan(percents), 0.0, np.minimum(product_price * percents / 100, caps))
+    return np.where(np.isnan(amounts), percent_savings, amounts)
+
+
+def _savings_percent(total_savings: float, product_mrp: float) -> float:
+    return round((total_savings / product_mrp * 100), 2) if product_mrp else 0
+
+
+def _instant_discount_option(
+    offer: Dict[str, Any],
     product_price: float,
     product_mrp: float,
-    offers: List[Dict[str, Any]]
-) -> List[Dict[str, Any]]:
+    base_discount: float,
+    additional_savings: float
+) -> Dict[str, Any]:
+    return {
+        "option_name": f"{offer['bank_name']} Instant Discount",
+        "payment_method": f"{offer['bank_name']} Card",
+        "final_price": round(product_price - additional_savings, 2),
+        "discount_from_mrp": base_discount,
+        "additional_savings": round(additional_savings, 2),
+        "total_savings": round(base_discount + additional_savings, 2),
+        "savings_percent": _savings_percent(base_discount + additional_savings, product_mrp),
+        "payment_type": "one_time",
+        "offer_details": offer['terms']
+    }
+
+
+def _cashback_option(
+    offer: Dict[str, Any],
+    product_price: float,
+    product_mrp: float,
+    base_discount: float
+) -> Dict[str, Any]:
+    cashback = offer['cashback_amount'] or 0
+    return {
+        "option_name": f"{offer['bank_name']} Cashback",
+        "payment_method": f"{offer['bank_name']} Card",
+        "final_price": product_price,  # Pay full price upfront
+        "cashback_amount": round(cashback, 2),
+        "effective_price": round(product_price - cashback, 2),
+        "discount_from_mrp": base_discount,
+        "additional_savings": round(cashback, 2),
+        "total_savings": round(base_discount + cashback, 2),
+        "savings_percent": _savings_percent(base_discount + cashback, product_mrp),
+        "payment_type": "cashback",
+        "cashback_credit_days": 90,  # Typically 90 days
+        "offer_details": offer['terms']
+    }
+
+
+def _no_cost_emi_option(
+    offer: Dict[str, Any],
+    product_mrp: float,
+    base_discount: float
+) -> Dict[str, Any]:
+    return {
+        "option_name": f"{offer['bank_name']} No Cost EMI",
+        "payment_method": f"{offer['bank_name']} Card",
+        "emi_per_month": round(offer['emi_amount'], 2),
+        "tenure_months": offer['emi_months'],
+        "total_amount": round(offer['emi_amount'] * offer['emi_months'], 2),
+        "processing_fee": EMI_PROCESSING_FEE,
+        "total_interest": 0,
+        "discount_from_mrp": base_discount,
+        "total_savings": base_discount,
+        "savings_percent": _savings_percent(base_discount, product_mrp),
+        "payment_type": "emi",
+        "offer_details": offer['terms']
+    }
+
+
+def calculate_total_savings(
+    product_price: float,
+    product_mrp: float,
+    offers: List[Dict[str, Any]],
+    sort: bool = True
+) -> Tuple[List[Dict[str, Any]], Dict[str, Optional[Dict[str, Any]]]]:
     """
     Calculate total savings for each payment option
     
@@ -184,12 +370,20 @@ async def calculate_total_savings(
         product_price: Current selling price
         product_mrp: Maximum Retail Price (original price)
         offers: List of card offers
+        sort: Sort the options by total savings (highest first)
         
     Returns:
-        List of payment options with savings
+        (payment options with savings, best option per kind) - the best
+        instant discount, cashback (highest total savings) and EMI (lowest
+        monthly payment) are tracked while the options are built
     """
     try:
         payment_options = []
+        bests = {
+            "best_instant_savings": None,
+            "best_cashback": None,
+            "best_emi": None
+        }
         
         # Base discount (current price vs MRP)
         base_discount = product_mrp - product_price if product_mrp else 0
@@ -202,86 +396,102 @@ async def calculate_total_savings(
             "discount_from_mrp": base_discount,
             "additional_savings": 0,
             "total_savings": base_discount,
-            "savings_percent": round((base_discount / product_mrp * 100), 2) if product_mrp else 0,
+            "savings_percent": _savings_percent(base_discount, product_mrp),
             "payment_type": "one_time"
         })
         
+        # Instant-discount savings of every offer at once
+        instant_savings = _instant_discount_savings(product_price, offers)
+        
         # Option 2-N: Card offers
-        for offer in offers:
-            final_price = product_price
-            additional_savings = 0
-            
+        for i, offer in enumerate(offers):
             if offer['offer_type'] == 'instant_discount':
-                if offer['discount_amount']:
-                    additional_savings = offer['discount_amount']
-                elif offer['discount_percent']:
-                    additional_savings = product_price * (offer['discount_percent'] / 100)
-                    # Apply max discount cap if exists
-                    if offer['max_discount']:
-                        additional_savings = min(additional_savings, offer['max_discount'])
-                
-                final_price = product_price - additional_savings
-                
-                payment_options.append({
-                    "option_name": f"{offer['bank_name']} Instant Discount",
-                    "payment_method": f"{offer['bank_name']} Card",
-                    "final_price": round(final_price, 2),
-                    "discount_from_mrp": base_discount,
-                    "additional_savings": round(additional_savings, 2),
-                    "total_savings": round(base_discount + additional_savings, 2),
-                    "savings_percent": round(((base_discount + additional_savings) / product_mrp * 100), 2) if product_mrp else 0,
-                    "payment_type": "one_time",
-                    "offer_details": offer['terms']
-                })
+                option = _instant_discount_option(
+                    offer, product_price, product_mrp, base_discount, float(instant_savings[i])
+                )
+                payment_options.append(option)
+                if not bests['best_instant_savings'] or option['total_savings'] > bests['best_instant_savings']['total_savings']:
+                    bests['best_instant_savings'] = option
             
             elif offer['offer_type'] == 'cashback':
-                cashback = offer['cashback_amount'] or 0
-                
-                payment_options.append({
-                    "option_name": f"{offer['bank_name']} Cashback",
-                    "payment_method": f"{offer['bank_name']} Card",
-                    "final_price": product_price,  # Pay full price upfront
-                    "cashback_amount": round(cashback, 2),
-                    "effective_price": round(product_price - cashback, 2),
-                    "discount_from_mrp": base_discount,
-                    "additional_savings": round(cashback, 2),
-                    "total_savings": round(base_discount + cashback, 2),
-                    "savings_percent": round(((base_discount + cashback) / product_mrp * 100), 2) if product_mrp else 0,
-                    "payment_type": "cashback",
-                    "cashback_credit_days": 90,  # Typically 90 days
-                    "offer_details": offer['terms']
-                })
+                option = _cashback_option(offer, product_price, product_mrp, base_discount)
+                payment_options.append(option)
+                if not bests['best_cashback'] or option['total_savings'] > bests['best_cashback']['total_savings']:
+                    bests['best_cashback'] = option
             
             elif offer['offer_type'] == 'no_cost_emi':
                 if offer['emi_months'] and offer['emi_amount']:
-                    payment_options.append({
-                        "option_name": f"{offer['bank_name']} No Cost EMI",
-                        "payment_method": f"{offer['bank_name']} Card",
-                        "emi_per_month": round(offer['emi_amount'], 2),
-                        "tenure_months": offer['emi_months'],
-                        "total_amount": round(offer['emi_amount'] * offer['emi_months'], 2),
-                        "processing_fee": 199.0,
-                        "total_interest": 0,
-                        "discount_from_mrp": base_discount,
-                        "total_savings": base_discount,
-                        "savings_percent": round((base_discount / product_mrp * 100), 2) if product_mrp else 0,
-                        "payment_type": "emi",
-                        "offer_details": offer['terms']
-                    })
+                    option = _no_cost_emi_option(offer, product_mrp, base_discount)
+                    payment_options.append(option)
+                    if not bests['best_emi'] or option['emi_per_month'] < bests['best_emi']['emi_per_month']:
+                        bests['best_emi'] = option
         
         # Sort by total savings (highest first)
-        payment_options.sort(key=lambda x: x.get('total_savings', 0), reverse=True)
+        if sort:
+            payment_options.sort(key=lambda x: x.get('total_savings', 0), reverse=True)
         
-        return payment_options
+        return payment_options, bests
         
     except Exception as e:
         logger.error(f"Error calculating savings: {str(e)}")
-        return []
+        return [], {}
+
+
+def _streaming_bests(
+    product_price: float,
+    product_mrp: float,
+    offers: List[Dict[str, Any]]
+) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Best instant discount, cashback and EMI option in one pass over the
+    offers - same winners as calculate_total_savings, but only the winners'
+    option dicts are built and nothing is sorted
+    """
+    try:
+        base_discount = product_mrp - product_price if product_mrp else 0
+        instant_savings = _instant_discount_savings(product_price, offers)
+        
+        # (rounded key, offer index) of the current winner per kind
+        best_instant = best_cashback = best_emi = None
+        for i, offer in enumerate(offers):
+            if offer['offer_type'] == 'instant_discount':
+                total = round(base_discount + float(instant_savings[i]), 2)
+                if best_instant is None or total > best_instant[0]:
+                    best_instant = (total, i)
+            
+            elif offer['offer_type'] == 'cashback':
+                total = round(base_discount + (offer['cashback_amount'] or 0), 2)
+                if best_cashback is None or total > best_cashback[0]:
+                    best_cashback = (total, i)
+            
+            elif offer['offer_type'] == 'no_cost_emi':
+                if offer['emi_months'] and offer['emi_amount']:
+                    emi_per_month = round(offer['emi_amount'], 2)
+                    if best_emi is None or emi_per_month < best_emi[0]:
+                        best_emi = (emi_per_month, i)
+        
+        return {
+            "best_instant_savings": _instant_discount_option(
+                offers[best_instant[1]], product_price, product_mrp, base_discount,
+                float(instant_savings[best_instant[1]])
+            ) if best_instant else None,
+            "best_cashback": _cashback_option(
+                offers[best_cashback[1]], product_price, product_mrp, base_discount
+            ) if best_cashback else None,
+            "best_emi": _no_cost_emi_option(
+                offers[best_emi[1]], product_mrp, base_discount
+            ) if best_emi else None
+        }
+        
+    except Exception as e:
+        logger.error(f"Error calculating best savings: {str(e)}")
+        return {}
 
 
 async def compare_payment_options(
     product_id: int,
-    db: Session
+    db: Session,
+    detail_level: Literal['bests', 'full'] = 'full'
 ) -> Dict[str, Any]:
     """
     Compare all available payment options for a product
@@ -289,13 +499,22 @@ async def compare_payment_options(
     Args:
         product_id: Product ID
         db: Database session
+        detail_level: 'full' for every payment option (sorted by savings),
+            'bests' for only the recommended best options (no payment_options list)
         
     Returns:
         Complete comparison of payment options
     """
     try:
-        # Get product details
-        product = db.query(Product).filter(Product.id == product_id).first()
+        cache_key = f"payment_options:{product_id}:{detail_level}"
+        # Cached as orjson bytes, so callers adding fields can't change the cached entry
+        cached_comparison = payment_cache.get(cache_key)
+        if cached_comparison is not None:
+            return orjson.loads(cached_comparison)
+        
+        # Get product details and its card offers in one query
+        # (no query at all if the session already holds the product)
+        product = db.get(Product, product_id, options=[joinedload(Product.card_offers)])
         
         if not product:
             return {
@@ -304,54 +523,46 @@ async def compare_payment_options(
             }
         
         # Get card offers
-        card_offers = await get_card_offers(db, product_id)
+        card_offers = await get_card_offers(db, product_id, product=product)
+        
+        product_price = float(product.price)
+        product_mrp = float(product.mrp) if product.mrp else product_price
         
         # Calculate regular EMI plans
-        regular_emi = await calculate_emi_plans(float(product.price))
+        regular_emi = calculate_emi_plans(product_price)
         
         # Calculate no-cost EMI plans
-        no_cost_emi = await calculate_no_cost_emi(float(product.price))
-        
-        # Calculate savings for each option
-        payment_options = await calculate_total_savings(
-            product_price=float(product.price),
-            product_mrp=float(product.mrp) if product.mrp else float(product.price),
-            offers=card_offers
-        )
-        
-        # Find best options
-        best_instant_savings = None
-        best_cashback = None
-        best_emi = None
-        
-        for option in payment_options:
-            if option['payment_type'] == 'one_time' and 'Instant Discount' in option['option_name']:
-                if not best_instant_savings or option['total_savings'] > best_instant_savings['total_savings']:
-                    best_instant_savings = option
-            
-            elif option['payment_type'] == 'cashback':
-                if not best_cashback or option['total_savings'] > best_cashback['total_savings']:
-                    best_cashback = option
-            
-            elif option['payment_type'] == 'emi':
-                if not best_emi or option['emi_per_month'] < best_emi['emi_per_month']:
-                    best_emi = option
+        no_cost_emi = calculate_no_cost_emi(product_price)
         
-        return {
+        comparison = {
             "success": True,
             "product_id": product_id,
             "product_name": product.name,
-            "product_price": float(product.price),
-            "product_mrp": float(product.mrp) if product.mrp else float(product.price),
-            "payment_options": payment_options,
+            "product_price": product_price,
+            "product_mrp": product_mrp
+        }
+        
+        if detail_level == 'bests':
+            best_options = _streaming_bests(product_price, product_mrp, card_offers)
+        else:
+            # Calculate savings for each option (and the best of each kind)
+            comparison["payment_options"], best_options = calculate_total_savings(
+                product_price=product_price,
+                product_mrp=product_mrp,
+                offers=card_offers
+            )
+        
+        comparison.update({
             "regular_emi_plans": regular_emi,
             "no_cost_emi_plans": no_cost_emi,
             "recommendations": {
-                "best_instant_savings": best_instant_savings,
-                "best_cashback": best_cashback,
-                "best_emi": best_emi
+                "best_instant_savings": best_options.get("best_instant_savings"),
+                "best_cashback": best_options.get("best_cashback"),
+                "best_emi": best_options.get("best_emi")
             }
-        }
+        })
+        payment_cache.set(cache_key, orjson.dumps(comparison))
+        return comparison
         
     except Exception as e:
         logger.error(f"Error comparing payment options: {str(e)}")
@@ -361,7 +572,14 @@ async def compare_payment_options(
         }
 
 
-async def get_emi_eligibility(
+def invalidate_payment_cache(product_id: int):
+    """Drop the cached card offers and payment comparison of a product (call after offer/price changes)"""
+    payment_cache.remove(f"card_offers:{product_id}")
+    payment_cache.remove(f"payment_options:{product_id}:full")
+    payment_cache.remove(f"payment_options:{product_id}:bests")
+
+
+def get_emi_eligibility(
     product_price: float,
     min_purchase_amount: float = 5000.0
 ) -> Dict[str, Any]:
@@ -3,14 +3,44 @@ Comparison Tools - Product Comparison Logic
 Handles fetching products and calculating differences for comparisons
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 from src.database.models import Product, Review
 from typing import List, Dict, Any
 from datetime import datetime
+from functools import lru_cache
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Product columns read when building comparison dicts
+COMPARISON_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.brand,
+    Product.model,
+    Product.category,
+    Product.subcategory,
+    Product.price,
+    Product.mrp,
+    Product.rating,
+    Product.review_count,
+    Product.in_stock,
+    Product.description,
+    Product.specifications,
+    Product.features,
+)
+
+
+@lru_cache(maxsize=4096)
+def _parse_specs(product_id: int, raw: str) -> Dict[str, Any]:
+    """Parsed specifications JSON of a product (memoized on id + raw text)"""
+    try:
+        specs = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return {}
+    return specs if isinstance(specs, dict) else {}
+
 
 class ComparisonTools:
     """Tools for product comparison operations"""
@@ -31,7 +61,9 @@ class ComparisonTools:
             List of product details
         """
         try:
-            products = db.query(Product).filter(
+            products = db.query(Product).options(
+                load_only(*COMPARISON_COLUMNS)
+            ).filter(
                 Product.id.in_(product_ids)
             ).all()
             
@@ -44,13 +76,9 @@ class ComparisonTools:
                 # Get specifications
                 specs = product.specifications if hasattr(product, 'specifications') else {}
                 
-                # Parse specifications if string
+                # Parse specifications if string (copy, so callers can't modify the cached dict)
                 if isinstance(specs, str):
-                    try:
-                        import json
-                        specs = json.loads(specs)
-                    except:
-                        specs = {}
+                    specs = dict(_parse_specs(product.id, specs))
                 
                 enriched_products.append({
                     "id": product.id,
@@ -92,31 +120,46 @@ class ComparisonTools:
         if len(products) < 2:
             return {"error": "Need at least 2 products to compare"}
         
+        # Price, rating and discount extremes (and the first product reaching each) in one pass
+        first = products[0]
+        cheapest = most_expensive = highest_rated = lowest_rated = best_deal = first
+        worst_discount = first['discount_pct']
+        for p in products[1:]:
+            if p['price'] < cheapest['price']:
+                cheapest = p
+            if p['price'] > most_expensive['price']:
+                most_expensive = p
+            if p['rating'] > highest_rated['rating']:
+                highest_rated = p
+            if p['rating'] < lowest_rated['rating']:
+                lowest_rated = p
+            if p['discount_pct'] > best_deal['discount_pct']:
+                best_deal = p
+            if p['discount_pct'] < worst_discount:
+                worst_discount = p['discount_pct']
+        
         # Price comparison
-        prices = [p['price'] for p in products]
         price_analysis = {
-            "cheapest": min(prices),
-            "most_expensive": max(prices),
-            "price_difference": max(prices) - min(prices),
-            "cheapest_product": next(p['name'] for p in products if p['price'] == min(prices)),
-            "expensive_product": next(p['name'] for p in products if p['price'] == max(prices))
+            "cheapest": cheapest['price'],
+            "most_expensive": most_expensive['price'],
+            "price_difference": most_expensive['price'] - cheapest['price'],
+            "cheapest_product": cheapest['name'],
+            "expensive_product": most_expensive['name']
         }
         
         # Rating comparison
-        ratings = [p['rating'] for p in products]
         rating_analysis = {
-            "highest_rated": max(ratings),
-            "lowest_rated": min(ratings),
-            "best_product": next(p['name'] for p in products if p['rating'] == max(ratings)),
-            "worst_product": next(p['name'] for p in products if p['rating'] == min(ratings))
+            "highest_rated": highest_rated['rating'],
+            "lowest_rated": lowest_rated['rating'],
+            "best_product": highest_rated['name'],
+            "worst_product": lowest_rated['name']
         }
         
         # Discount comparison
-        discounts = [p['discount_pct'] for p in products]
         discount_analysis = {
-            "best_discount": max(discounts),
-            "worst_discount": min(discounts),
-            "best_deal_product": next(p['name'] for p in products if p['discount_pct'] == max(discounts))
+            "best_discount": best_deal['discount_pct'],
+            "worst_discount": worst_discount,
+            "best_deal_product": best_deal['name']
         }
         
         # Specification comparison (key specs)
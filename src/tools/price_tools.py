@@ -14,9 +14,9 @@ For Beginners:
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, text
 from src.database.models import PriceHistory, Product
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import logging
 
@@ -30,7 +30,8 @@ class PriceTools:
         self,
         db: Session,
         product_id: int,
-        days: int = 30
+        days: int = 30,
+        buckets: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Get price history for a product
@@ -39,17 +40,46 @@ class PriceTools:
             db: Database session
             product_id: Product ID to get history for
             days: Number of days to look back (default: 30)
+            buckets: If set, downsample to at most this many points by
+                     averaging price over equal time buckets (in the database)
             
         Returns:
             List of price entries like: [{"price": 2199, "date": "2026-01-01"}, ...]
+            (newest first; with buckets, "date" is the bucket start)
             
         Example:
             history = await get_price_history(db, product_id=123, days=30)
             # Returns last 30 days of prices
+            
+            history = await get_price_history(db, product_id=123, days=365, buckets=365)
+            # Returns one averaged point per day
         """
         # Calculate cutoff date (e.g., 30 days ago from today)
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
+        if buckets:
+            # date_bin(stride, ts, origin) groups rows into fixed-width time buckets
+            bucket = func.date_bin(
+                timedelta(days=days) / buckets,
+                PriceHistory.recorded_at,
+                cutoff_date
+            ).label("bucket")
+            history = db.query(
+                bucket,
+                func.avg(PriceHistory.price).label("price")
+            ).filter(
+                PriceHistory.product_id == product_id,
+                PriceHistory.recorded_at >= cutoff_date
+            ).group_by(bucket).order_by(desc(bucket)).all()
+            
+            return [
+                {
+                    "price": round(float(h.price), 2),
+                    "date": h.bucket.isoformat()
+                }
+                for h in history
+            ]
+        
         # Query database for price history
         history = db.query(PriceHistory).filter(
             PriceHistory.product_id == product_id,
@@ -111,6 +141,34 @@ class PriceTools:
         product = db.query(Product).filter(Product.id == product_id).first()
         current_price = float(product.price) if product else 0
         
+        trend_data = self.summarize_price_trend(history, current_price)
+        
+        # Prepare chart data for frontend visualization
+        trend_data["chart_data"] = self._prepare_chart_data(  # Frontend-ready chart format
+            history,
+            current_price,
+            trend_data["average_price"],
+            trend_data["min_price"],
+            trend_data["max_price"]
+        )
+        
+        return trend_data
+    
+    def summarize_price_trend(
+        self,
+        history: List[Dict[str, Any]],
+        current_price: float
+    ) -> Dict[str, Any]:
+        """
+        Trend statistics and buy/wait recommendation from loaded price history
+        
+        Args:
+            history: Non-empty price history, newest first (see get_price_history)
+            current_price: Current product price
+            
+        Returns:
+            Trend analysis (same keys as calculate_price_trend, without chart_data)
+        """
         # Extract just the price values from history
         prices = [h['price'] for h in history]
         
@@ -152,9 +210,6 @@ class PriceTools:
         else:
             recommendation = "good_time"  # Fair price
         
-        # Prepare chart data for frontend visualization
-        chart_data = self._prepare_chart_data(history, current_price, avg_price, min_price, max_price)
-        
         return {
             "current_price": current_price,
             "average_price": round(avg_price, 2),
@@ -163,8 +218,7 @@ class PriceTools:
             "trend": trend,
             "price_change_pct": round(price_change_pct, 2),
             "recommendation": recommendation,
-            "data_points": len(history),
-            "chart_data": chart_data  # Frontend-ready chart format
+            "data_points": len(history)
         }
     
     def _prepare_chart_data(
@@ -306,6 +360,7 @@ class PriceTools:
         Find products with significant discounts
         
         A "deal" is when current price is much lower than MRP (Maximum Retail Price)
+        Reads the precomputed mv_product_deals view (refreshed every minute)
         
         Args:
             db: Database session
@@ -320,107 +375,62 @@ class PriceTools:
             deals = await find_deals(db, category="Electronics", min_discount=20)
             # Returns: Electronics products with 20%+ discount
         """
-        # Start building query
-        query = db.query(Product).filter(
-            Product.mrp.isnot(None),  # Must have MRP
-            Product.in_stock == True   # Must be in stock
+        return self._query_deals_view(
+            db,
+            category=category,
+            min_discount=min_discount,
+            flash_only=False,
+            limit=limit
         )
-        
-        # Filter by category if provided
-        if category:
-            query = query.filter(Product.category == category)
-        
-        # Get all matching products
-        products = query.limit(limit * 2).all()  # Get extra for filtering
-        
-        deals = []
-        for product in products:
-            if product.mrp and product.price:
-                # Calculate discount percentage
-                # Formula: ((MRP - Price) / MRP) * 100
-                discount_pct = ((product.mrp - product.price) / product.mrp) * 100
-                
-                # Only include if discount meets minimum threshold
-                if discount_pct >= min_discount:
-                    # Check if this is a flash deal (price dropped recently)
-                    is_flash = await self._is_flash_deal(db, product.id)
-                    
-                    deals.append({
-                        "product_id": product.id,
-                        "name": product.name,
-                        "brand": product.brand,
-                        "category": product.category,
-                        "price": float(product.price),
-                        "mrp": float(product.mrp),
-                        "discount_pct": round(discount_pct, 2),
-                        "savings": round(product.mrp - product.price, 2),
-                        "rating": float(product.rating),
-                        "review_count": product.review_count,
-                        "is_flash_deal": is_flash,  # NEW: Flash deal indicator
-                        "deal_type": "flash" if is_flash else "regular"  # NEW: Deal type
-                    })
-        
-        # Sort by discount percentage (highest discount first)
-        deals.sort(key=lambda x: x['discount_pct'], reverse=True)
-        
-        return deals[:limit]  # Return only requested number
     
-    async def _is_flash_deal(
+    def _query_deals_view(
         self,
         db: Session,
-        product_id: int
-    ) -> bool:
+        category: str,
+        min_discount: float,
+        flash_only: bool,
+        limit: int
+    ) -> List[Dict[str, Any]]:
         """
-        Detect if product is a flash/blast deal
+        Top deals by discount from the mv_product_deals materialized view
         
-        A flash deal is when:
-        1. Price dropped significantly (>10%) in last 48 hours
-        2. OR price is at all-time low in last 90 days
-        
-        Args:
-            db: Database session
-            product_id: Product ID
-            
-        Returns:
-            True if flash deal, False otherwise
+        Discount % and the flash-deal flag are computed in the view
+        (see src/database/deals_view.py for the flash deal rules)
         """
-        try:
-            # Get recent price history (last 7 days)
-            recent_history = await self.get_price_history(db, product_id, days=7)
-            
-            if len(recent_history) < 2:
-                return False
-            
-            # Current price
-            current_price = recent_history[0]['price']
-            
-            # Price 2 days ago
-            if len(recent_history) >= 3:
-                old_price = recent_history[2]['price']
-                
-                # Calculate price drop
-                price_drop_pct = ((old_price - current_price) / old_price) * 100
-                
-                # Flash deal if dropped >10% in last 48 hours
-                if price_drop_pct >= 10:
-                    return True
-            
-            # Check if at all-time low (last 90 days)
-            full_history = await self.get_price_history(db, product_id, days=90)
-            
-            if full_history:
-                all_prices = [h['price'] for h in full_history]
-                min_price = min(all_prices)
-                
-                # Flash deal if current price is lowest in 90 days
-                if current_price <= min_price * 1.01:  # Within 1% of lowest
-                    return True
-            
-            return False
-            
-        except Exception as e:
-            # If error, not a flash deal
-            return False
+        conditions = ["discount_pct >= :min_discount"]
+        params = {"min_discount": min_discount, "limit": limit}
+        
+        # Filter by category if provided
+        if category:
+            conditions.append("category = :category")
+            params["category"] = category
+        if flash_only:
+            conditions.append("is_flash_deal")
+        
+        rows = db.execute(text(
+            "SELECT * FROM mv_product_deals"
+            f" WHERE {' AND '.join(conditions)}"
+            " ORDER BY discount_pct DESC"
+            " LIMIT :limit"
+        ), params).mappings().all()
+        
+        return [
+            {
+                "product_id": row["product_id"],
+                "name": row["name"],
+                "brand": row["brand"],
+                "category": row["category"],
+                "price": float(row["price"]),
+                "mrp": float(row["mrp"]),
+                "discount_pct": round(row["discount_pct"], 2),
+                "savings": round(row["mrp"] - row["price"], 2),
+                "rating": float(row["rating"]),
+                "review_count": row["review_count"],
+                "is_flash_deal": row["is_flash_deal"],  # Flash deal indicator
+                "deal_type": "flash" if row["is_flash_deal"] else "regular"  # Deal type
+            }
+            for row in rows
+        ]
     
     async def find_flash_deals(
         self,
@@ -443,11 +453,14 @@ class PriceTools:
         Returns:
             List of flash deals with urgency indicators
         """
-        # Get all deals
-        all_deals = await self.find_deals(db, category, min_discount=10.0, limit=limit * 3)
-        
-        # Filter only flash deals
-        flash_deals = [deal for deal in all_deals if deal.get('is_flash_deal')]
+        # Get only flash deals (filtered in the deals view)
+        flash_deals = self._query_deals_view(
+            db,
+            category=category,
+            min_discount=10.0,
+            flash_only=True,
+            limit=limit
+        )
         
         # Add urgency score
         for deal in flash_deals:
@@ -466,10 +479,9 @@ class PriceTools:
             deal['urgency_level'] = urgency_level
             deal['urgency_score'] = round(urgency_score, 2)
         
-        # Sort by urgency (highest first)
-        flash_deals.sort(key=lambda x: x['urgency_score'], reverse=True)
-        
-        return flash_deals[:limit]
+        # Already ordered by urgency (= discount, highest first) and limited
+        # by the view query's ORDER BY ... LIMIT
+        return flash_deals
 
 
 # Global instance for easy importing
@@ -2,7 +2,8 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from src.database.models import Review
-from typing import Dict, List
+from typing import Dict, List, Tuple
+from collections import Counter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -78,8 +79,7 @@ class ReviewTools:
         
         # Rating distribution
         distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for r in reviews:
-            distribution[r.rating] = distribution.get(r.rating, 0) + 1
+        distribution.update(Counter(r.rating for r in reviews))
         
         # Convert to percentages
         distribution_pct = {
@@ -95,6 +95,83 @@ class ReviewTools:
             "verified_purchases": sum(1 for r in reviews if r.verified_purchase)
         }
     
+    async def get_reviews_with_statistics(
+        self,
+        db: Session,
+        product_id: int,
+        limit: int = 100
+    ) -> Tuple[List[Dict], Dict]:
+        """
+        Get the top reviews and the review statistics in a single query
+        
+        Same results as get_reviews + get_review_statistics: the statistics
+        over all of the product's reviews come back as window aggregates
+        repeated on every returned row (windows are evaluated before LIMIT).
+        
+        Args:
+            db: Database session
+            product_id: Product ID
+            limit: Maximum reviews to fetch
+            
+        Returns:
+            (reviews, statistics)
+        """
+        rating_counts = [
+            func.count().filter(Review.rating == rating).over().label(f"rating_{rating}")
+            for rating in range(1, 6)
+        ]
+        
+        rows = db.query(
+            Review.rating,
+            Review.review_text,
+            Review.verified_purchase,
+            Review.helpful_count,
+            func.count().over().label("total"),
+            func.avg(Review.rating).over().label("avg_rating"),
+            func.count().filter(Review.verified_purchase == True).over().label("verified"),
+            *rating_counts
+        ).filter(
+            Review.product_id == product_id
+        ).order_by(
+            Review.helpful_count.desc()
+        ).limit(limit).all()
+        
+        if not rows:
+            return [], {
+                "total_reviews": 0,
+                "average_rating": 0,
+                "rating_distribution": {},
+                "rating_distribution_pct": {},
+                "verified_purchases": 0
+            }
+        
+        reviews = [
+            {
+                "rating": r.rating,
+                "text": r.review_text,
+                "verified": r.verified_purchase,
+                "helpful_count": r.helpful_count
+            }
+            for r in rows
+        ]
+        
+        first = rows[0]
+        total = first.total
+        distribution = {rating: getattr(first, f"rating_{rating}") for rating in range(1, 6)}
+        
+        stats = {
+            "total_reviews": total,
+            "average_rating": round(float(first.avg_rating), 2),
+            "rating_distribution": distribution,
+            "rating_distribution_pct": {
+                rating: (count / total) * 100
+                for rating, count in distribution.items()
+            },
+            "verified_purchases": first.verified
+        }
+        
+        return reviews, stats
+    
     async def extract_themes(
         self,
         reviews: List[Dict],
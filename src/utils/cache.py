@@ -4,47 +4,60 @@ Simple in-memory cache for agent results
 Speeds up repeated queries and reduces database load
 """
 from typing import Any, Optional
-from datetime import datetime, timedelta
 import threading
+import time
+
+from cachetools import TTLCache
+
+# Independent shards, each with its own lock, so concurrent threads rarely contend
+NUM_SHARDS = 16
 
 class SimpleCache:
-    """Thread-safe in-memory cache with TTL"""
+    """Thread-safe in-memory cache with TTL and bounded size (LRU eviction)"""
     
-    def __init__(self, ttl_seconds: int = 300):  # 5 minutes default TTL
-        self.cache = {}
+    def __init__(self, ttl_seconds: int = 300, max_size: int = 10_000):  # 5 minutes default TTL
         self.ttl = ttl_seconds
-        self.lock = threading.Lock()
+        # TTLCache timed in time.monotonic_ns() ticks: expiry checks stay integer compares
+        self.shards = [
+            TTLCache(
+                maxsize=max(1, max_size // NUM_SHARDS),
+                ttl=ttl_seconds * 1_000_000_000,
+                timer=time.monotonic_ns
+            )
+            for _ in range(NUM_SHARDS)
+        ]
+        self.locks = [threading.Lock() for _ in range(NUM_SHARDS)]
+    
+    def _shard(self, key: str) -> int:
+        """Shard index for a key"""
+        return hash(key) % NUM_SHARDS
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache if not expired"""
-        with self.lock:
-            if key in self.cache:
-                value, timestamp = self.cache[key]
-                # Check if expired
-                if datetime.now() - timestamp < timedelta(seconds=self.ttl):
-                    return value
-                else:
-                    # Remove expired entry
-                    del self.cache[key]
-            return None
+        shard = self._shard(key)
+        with self.locks[shard]:
+            return self.shards[shard].get(key)
     
     def set(self, key: str, value: Any):
-        """Set value in cache with current timestamp"""
-        with self.lock:
-            self.cache[key] = (value, datetime.now())
+        """Set value in cache (evicts the least recently used entry when the shard is full)"""
+        shard = self._shard(key)
+        with self.locks[shard]:
+            self.shards[shard][key] = value
     
     def clear(self):
         """Clear all cache"""
-        with self.lock:
-            self.cache.clear()
+        for lock, cache in zip(self.locks, self.shards):
+            with lock:
+                cache.clear()
     
     def remove(self, key: str):
         """Remove specific key from cache"""
-        with self.lock:
-            if key in self.cache:
-                del self.cache[key]
+        shard = self._shard(key)
+        with self.locks[shard]:
+            self.shards[shard].pop(key, None)
 
 # Global cache instances for different agents
 review_cache = SimpleCache(ttl_seconds=600)  # 10 minutes for reviews
 comparison_cache = SimpleCache(ttl_seconds=300)  # 5 minutes for comparisons
 price_cache = SimpleCache(ttl_seconds=180)  # 3 minutes for prices
+payment_cache = SimpleCache(ttl_seconds=60, max_size=1024)  # 1 minute for card offers / payment options
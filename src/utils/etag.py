@@ -0,0 +1,41 @@
+# src/utils/etag.py
+"""
+ETag / If-None-Match support for idempotent GET endpoints
+
+The response body is serialized once, hashed (xxh3) into a strong ETag,
+and a client that already holds that version gets an empty 304.
+"""
+from typing import Any, Optional
+
+import orjson
+import xxhash
+from fastapi import Request, Response
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def etag_response(request: Request, body: Any, cache_control: Optional[str] = None) -> Response:
+    """
+    Serialize `body` to JSON with an ETag header, or return 304 if the
+    client's If-None-Match already has this version
+    
+    Usage:
+        return etag_response(request, {"products": products}, cache_control="public, max-age=60")
+    """
+    content = orjson.dumps(body, default=str, option=orjson.OPT_NON_STR_KEYS)
+    headers = {"ETag": f'"{xxhash.xxh3_64_hexdigest(content)}"'}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    
+    if _matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content, media_type="application/json", headers=headers)
@@ -0,0 +1,121 @@
+# src/utils/redis_cache.py
+"""
+Redis-backed response cache for hot read endpoints
+Shared across workers; silently disabled if Redis is missing or down
+"""
+from typing import Any, Callable, Optional
+from functools import wraps
+import logging
+import os
+import time
+
+import orjson
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional - endpoints just skip caching
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# After a connection error, skip Redis for this many seconds
+RETRY_AFTER_SECONDS = 30
+
+_client = None
+_disabled_until = 0.0
+
+
+def get_redis():
+    """Get the shared async Redis client (None if Redis is unavailable)"""
+    global _client
+    if aioredis is None or time.monotonic() < _disabled_until:
+        return None
+    if _client is None:
+        _client = aioredis.from_url(REDIS_URL, socket_timeout=0.5)
+    return _client
+
+
+def _mark_down(error: Exception):
+    """Back off from Redis for a while after an error"""
+    global _disabled_until
+    _disabled_until = time.monotonic() + RETRY_AFTER_SECONDS
+    logger.warning(f"Redis unavailable, caching disabled for {RETRY_AFTER_SECONDS}s: {error}")
+
+
+async def cache_get(key: str) -> Optional[bytes]:
+    """Get raw cached bytes (None on miss or if Redis is unavailable)"""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        return await client.get(key)
+    except Exception as e:
+        _mark_down(e)
+        return None
+
+
+async def cache_set(key: str, value: bytes, ttl: int):
+    """Store raw bytes with TTL in seconds (no-op if Redis is unavailable)"""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        await client.setex(key, ttl, value)
+    except Exception as e:
+        _mark_down(e)
+
+
+async def cache_delete(*keys: str):
+    """Delete keys (no-op if Redis is unavailable)"""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        await client.delete(*keys)
+    except Exception as e:
+        _mark_down(e)
+
+
+def _json_default(obj: Any):
+    """orjson fallback for Pydantic models and other non-native types"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize a route result to JSON bytes for caching"""
+    return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def redis_cached(prefix: str, ttl: int, key: Callable[..., str]):
+    """
+    Decorator for caching async route handler results in Redis
+    
+    `key` receives the handler's keyword arguments and returns the part of
+    the cache key that identifies the request. Exceptions are not cached.
+    
+    Usage:
+        @router.get("/deals")
+        @redis_cached("deals", ttl=120, key=lambda category, limit, **_: f"{category}:{limit}")
+        async def get_best_deals(category: Optional[str] = None, limit: int = 10):
+            ...
+    """
+    def decorator(func: Callable):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            cache_key = f"{prefix}:{key(**kwargs)}"
+            
+            cached = await cache_get(cache_key)
+            if cached is not None:
+                return orjson.loads(cached)
+            
+            result = await func(*args, **kwargs)
+            await cache_set(cache_key, dumps(result), ttl)
+            
+            return result
+        
+        return wrapper
+    return decorator
@@ -0,0 +1,55 @@
+# tests/test_cache_manager.py
+import asyncio
+
+import pytest
+
+from src.services import cache_manager
+from src.services.cache_manager import CacheManager
+
+
+class FakeRedis:
+    """In-memory stand-in for the async Redis client (get/setex only)"""
+    
+    def __init__(self):
+        self.store = {}
+    
+    async def get(self, key):
+        return self.store.get(key)
+    
+    async def setex(self, key, ttl, value):
+        self.store[key] = value
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(cache_manager, "get_redis", lambda: client)
+    return client
+
+
+def test_round_trips_int_dict_keys(fake_redis):
+    cache = CacheManager()
+    value = {
+        "statistics": {
+            "rating_distribution": {5: 10, 4: 3, 3: 0, 2: 1, 1: 0},
+            "rating_distribution_pct": {5: 71.4, 4: 21.4, 3: 0.0, 2: 7.1, 1: 0.0},
+        }
+    }
+    
+    asyncio.run(cache.set("reviews:analyze:1", value))
+    
+    assert asyncio.run(cache.get("reviews:analyze:1")) == value
+
+
+def test_undecodable_entry_is_a_miss(fake_redis):
+    fake_redis.store["bad"] = b"\xc1"  # never-used msgpack byte
+    
+    assert asyncio.run(CacheManager().get("bad")) is None
+
+
+def test_key_rejects_non_json_arguments():
+    cache = CacheManager()
+    
+    assert cache._generate_key("p", args=(1, 2)) == cache._generate_key("p", args=(1, 2))
+    with pytest.raises(TypeError):
+        cache._generate_key("p", args=(object(),))